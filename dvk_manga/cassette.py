@@ -0,0 +1,415 @@
+from gzip import open as gzip_open
+from json import dumps
+from json import loads
+from time import sleep
+from time import monotonic
+from shutil import copyfileobj
+from pathlib import Path
+from bs4 import BeautifulSoup
+from json.decoder import JSONDecodeError
+from dvk_archive.web.heavy_connect import HeavyConnect
+
+RECORD = "record"
+REPLAY = "replay"
+CASSETTE_VERSION = 2
+BODIES_SUFFIX = ".bodies"
+CHUNK_SIZE = 65536
+# CASSETTE USED BY ALL CONNECTIONS, IF ANY
+ACTIVE = {"cassette": None}
+
+
+class Cassette:
+    """
+    Recording of the HTTP and rendered page responses of a run, so the
+    same run can be replayed later without any network access.
+    Response bodies are appended to a bodies file as they are recorded,
+    and the cassette file holds a gzipped JSON line index of them, so
+    only the index is kept in memory and a crashed run keeps everything
+    recorded before the crash.
+
+    Attributes:
+        file (Path): Path of the cassette index file
+        mode (str): Either RECORD or REPLAY
+        latency (bool): Whether to wait for the recorded latency on replay
+        entries (dict): Recorded responses for each "kind url" key
+        positions (dict): Number of responses replayed for each key
+        index_out (GzipFile): Open index file while recording
+        bodies (file): Open bodies file while recording or replaying
+    """
+
+    def __init__(
+            self,
+            file_str: str = None,
+            mode: str = REPLAY,
+            latency: bool = False):
+        """
+        Initializes Cassette attributes.
+
+        Parameters:
+            file_str (str): Path of the cassette file
+            mode (str): Either RECORD or REPLAY
+            latency (bool): Whether to wait for the recorded latency on replay
+        """
+        self.file = None
+        if file_str is not None and not file_str == "":
+            self.file = Path(file_str)
+        self.mode = mode
+        self.latency = latency
+        self.entries = dict()
+        self.positions = dict()
+        self.index_out = None
+        self.bodies = None
+
+    def get_bodies_file(self) -> Path:
+        """
+        Returns the path of the file holding the recorded response bodies.
+
+        Returns:
+            Path: Bodies file path, None if the cassette has no file
+        """
+        if self.file is None:
+            return None
+        return Path(str(self.file.absolute()) + BODIES_SUFFIX)
+
+    def read_cassette(self):
+        """
+        Reads the response index from the cassette file, if it exists.
+        Responses recorded before a crash are kept, as long as their
+        bodies were written in full.
+        """
+        self.close_cassette()
+        self.entries = dict()
+        self.positions = dict()
+        if self.file is None or not self.file.is_file():
+            return
+        try:
+            with gzip_open(str(self.file.absolute()), "rt") as in_file:
+                header = loads(in_file.readline())
+                if not header["version"] == CASSETTE_VERSION:
+                    print("Unsupported cassette version")
+                    return
+                try:
+                    for line in in_file:
+                        self.add_entry(loads(line))
+                except (EOFError, JSONDecodeError):
+                    # FILE WAS NOT FINISHED, KEEP WHAT WAS RECORDED
+                    pass
+        except (IOError, EOFError, JSONDecodeError, KeyError, TypeError):
+            print("Error reading cassette")
+            self.entries = dict()
+            return
+        # DROP RESPONSES WHOSE BODIES WERE CUT OFF
+        bodies = self.get_bodies_file()
+        size = 0
+        if bodies.is_file():
+            size = bodies.stat().st_size
+        for key in self.entries:
+            self.entries[key] = [
+                response for response in self.entries[key]
+                if response["offset"] + response["size"] <= size]
+
+    def add_entry(self, record: dict = None):
+        """
+        Adds a response record read from the index to the entries.
+
+        Parameters:
+            record (dict): Record with "key", "offset", "size",
+                           "headers" and "latency"
+        """
+        try:
+            response = {
+                "offset": int(record["offset"]),
+                "size": int(record["size"]),
+                "headers": dict(record["headers"]),
+                "latency": float(record["latency"])}
+            key = str(record["key"])
+        except (KeyError, TypeError, ValueError):
+            return
+        if key not in self.entries:
+            self.entries[key] = []
+        self.entries[key].append(response)
+
+    def open_recording(self):
+        """
+        Creates the cassette files for recording, if not already open.
+        """
+        if self.file is None or self.index_out is not None:
+            return
+        self.index_out = gzip_open(str(self.file.absolute()), "wt")
+        self.index_out.write(dumps({"version": CASSETTE_VERSION}) + "\n")
+        self.index_out.flush()
+        self.bodies = open(str(self.get_bodies_file().absolute()), "wb")
+
+    def write_cassette(self):
+        """
+        Finishes writing the cassette files, creating them if nothing
+        was recorded. When replaying, only closes the bodies file.
+        """
+        if self.file is None or not self.mode == RECORD:
+            self.close_cassette()
+            return
+        try:
+            self.open_recording()
+        except IOError as e:
+            print("File error: " + str(e))
+        self.close_cassette()
+
+    def close_cassette(self):
+        """
+        Closes any open cassette files.
+        """
+        if self.index_out is not None:
+            self.index_out.close()
+            self.index_out = None
+        if self.bodies is not None:
+            self.bodies.close()
+            self.bodies = None
+
+    def add_record(
+            self,
+            key: str = None,
+            response: dict = None):
+        """
+        Adds a response to the entries and appends it to the index file.
+
+        Parameters:
+            key (str): "kind url" key of the response
+            response (dict): Response with "headers", "latency" and either
+                             "body" or its "offset" and "size"
+        """
+        if key not in self.entries:
+            self.entries[key] = []
+        self.entries[key].append(response)
+        if self.index_out is not None:
+            record = dict(response)
+            record["key"] = key
+            self.index_out.write(dumps(record, separators=(",", ":")) + "\n")
+            self.index_out.flush()
+
+    def add_response(
+            self,
+            kind: str = None,
+            url: str = None,
+            body: bytes = None,
+            headers: dict = None,
+            latency: float = 0.0):
+        """
+        Records a response.
+
+        Parameters:
+            kind (str): Type of request ("page", "media" or "rendered")
+            url (str): URL of the request
+            body (bytes): Body of the response
+            headers (dict): Headers of the response
+            latency (float): Seconds taken to get the response
+        """
+        if kind is None or url is None or body is None:
+            return
+        if headers is None:
+            headers = dict()
+        response = {"headers": dict(headers), "latency": round(latency, 4)}
+        if self.file is None:
+            # NO FILE, SO KEEP THE BODY IN MEMORY
+            response["body"] = body
+        else:
+            self.open_recording()
+            response["offset"] = self.bodies.tell()
+            response["size"] = len(body)
+            self.bodies.write(body)
+            self.bodies.flush()
+        self.add_record(kind + " " + url, response)
+
+    def add_file_response(
+            self,
+            kind: str = None,
+            url: str = None,
+            body_file: Path = None,
+            headers: dict = None,
+            latency: float = 0.0):
+        """
+        Records a response whose body was saved to a file, copying the
+        file to the bodies file in chunks instead of reading it in full.
+
+        Parameters:
+            kind (str): Type of request ("page", "media" or "rendered")
+            url (str): URL of the request
+            body_file (Path): File holding the body of the response
+            headers (dict): Headers of the response
+            latency (float): Seconds taken to get the response
+        """
+        if (kind is None
+                or url is None
+                or body_file is None
+                or not Path(body_file).is_file()):
+            return
+        if self.file is None:
+            self.add_response(
+                kind, url, Path(body_file).read_bytes(), headers, latency)
+            return
+        if headers is None:
+            headers = dict()
+        self.open_recording()
+        response = {"headers": dict(headers), "latency": round(latency, 4)}
+        response["offset"] = self.bodies.tell()
+        with open(str(Path(body_file).absolute()), "rb") as in_file:
+            copyfileobj(in_file, self.bodies, CHUNK_SIZE)
+        self.bodies.flush()
+        response["size"] = self.bodies.tell() - response["offset"]
+        self.add_record(kind + " " + url, response)
+
+    def read_body(self, response: dict = None) -> bytes:
+        """
+        Returns the body of a recorded response.
+
+        Parameters:
+            response (dict): Recorded response
+
+        Returns:
+            bytes: Body of the response
+        """
+        if "body" in response:
+            return response["body"]
+        if self.bodies is None:
+            bodies = self.get_bodies_file()
+            self.bodies = open(str(bodies.absolute()), "rb")
+        self.bodies.seek(response["offset"])
+        return self.bodies.read(response["size"])
+
+    def get_response(self, kind: str = None, url: str = None) -> dict:
+        """
+        Returns the next recorded response for a request.
+        Repeated requests get the responses in the order they were
+        recorded, then the last one again.
+
+        Parameters:
+            kind (str): Type of request ("page", "media" or "rendered")
+            url (str): URL of the request
+
+        Returns:
+            dict: Response with "body" bytes, "headers" and "latency",
+                  None if the request was not recorded
+        """
+        if kind is None or url is None:
+            return None
+        key = kind + " " + url
+        responses = self.entries.get(key)
+        if responses is None or len(responses) == 0:
+            return None
+        position = self.positions.get(key, 0)
+        self.positions[key] = position + 1
+        response = responses[min(position, len(responses) - 1)]
+        if self.latency and response["latency"] > 0:
+            sleep(response["latency"])
+        return {
+            "body": self.read_body(response),
+            "headers": response["headers"],
+            "latency": response["latency"]}
+
+
+class CassetteConnect:
+    """
+    Stand-in for HeavyConnect that records rendered pages to a cassette
+    or replays them from it.
+
+    Attributes:
+        cassette (Cassette): Cassette to record to or replay from
+        connect (HeavyConnect): Browser connection used when recording
+    """
+
+    def __init__(self, cassette: Cassette = None, connect=None):
+        """
+        Initializes CassetteConnect attributes.
+
+        Parameters:
+            cassette (Cassette): Cassette to record to or replay from
+            connect (HeavyConnect): Browser connection used when recording
+        """
+        self.cassette = cassette
+        self.connect = connect
+
+    def get_page(
+            self,
+            url: str = None,
+            wait: int = 0,
+            element: str = None) -> BeautifulSoup:
+        """
+        Returns a BeautifulSoup object for a rendered page.
+
+        Parameters:
+            url (str): URL to retrieve
+            wait (int): Seconds to wait after initially loading the URL
+            element (str): Element to wait for (XPATH) when loading URL
+
+        Returns:
+            BeautifulSoup: BeautifulSoup object of the url page
+        """
+        if url is None or url == "" or self.cassette is None:
+            return None
+        if self.cassette.mode == REPLAY:
+            response = self.cassette.get_response("rendered", url)
+            if response is None:
+                return None
+            return BeautifulSoup(response["body"].decode("utf-8"), "lxml")
+        if self.connect is None:
+            return None
+        start = monotonic()
+        bs = self.connect.get_page(url, wait, element)
+        if bs is not None:
+            self.cassette.add_response(
+                "rendered", url, str(bs).encode("utf-8"),
+                latency=monotonic() - start)
+        return bs
+
+    def close_driver(self):
+        """
+        Closes the browser connection, if there is one.
+        """
+        if self.connect is not None:
+            self.connect.close_driver()
+
+
+def set_cassette(cassette: Cassette = None):
+    """
+    Sets the cassette used by all connections.
+
+    Parameters:
+        cassette (Cassette): Cassette to use, None for live connections only
+    """
+    ACTIVE["cassette"] = cassette
+
+
+def get_cassette() -> Cassette:
+    """
+    Returns the cassette used by all connections.
+
+    Returns:
+        Cassette: Active cassette, None if not recording or replaying
+    """
+    return ACTIVE["cassette"]
+
+
+def is_replaying() -> bool:
+    """
+    Returns whether connections are being replayed from a cassette.
+
+    Returns:
+        bool: Whether a cassette is being replayed
+    """
+    cassette = get_cassette()
+    return cassette is not None and cassette.mode == REPLAY
+
+
+def get_connect():
+    """
+    Returns a connection for rendered pages, recording or replaying
+    through the active cassette if there is one.
+
+    Returns:
+        HeavyConnect: HeavyConnect or CassetteConnect
+    """
+    cassette = get_cassette()
+    if cassette is None:
+        return HeavyConnect()
+    if cassette.mode == REPLAY:
+        return CassetteConnect(cassette)
+    return CassetteConnect(cassette, HeavyConnect())
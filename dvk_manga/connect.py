@@ -0,0 +1,359 @@
+from os import remove
+from os import replace
+from time import monotonic
+from hashlib import sha256
+from bs4 import BeautifulSoup
+from pathlib import Path
+from requests import Session
+from requests import exceptions
+from requests.adapters import HTTPAdapter
+from urllib.error import HTTPError
+from dvk_archive.file.dvk import Dvk
+from dvk_archive.web.basic_connect import get_headers
+from dvk_archive.web.basic_connect import get_last_modified
+from dvk_archive.processing.string_processing import get_extension
+from dvk_manga.cassette import get_cassette
+from dvk_manga.cassette import is_replaying
+from dvk_manga.scheduler import TokenBucket
+from dvk_manga.verify import add_hash
+
+POOL_SIZE = 10
+CHUNK_SIZE = 65536
+# SHARED SESSION, CREATED WHEN FIRST USED
+SESSION = {"session": None, "pool_size": POOL_SIZE}
+
+
+def get_session() -> Session:
+    """
+    Returns the shared HTTP session, creating it if necessary.
+    Connections are kept alive and pooled per host, so repeated requests
+    to the same host skip the TCP and TLS handshakes.
+
+    Returns:
+        Session: Shared requests Session
+    """
+    if SESSION["session"] is None:
+        session = Session()
+        session.headers.update(get_headers())
+        size = SESSION["pool_size"]
+        adapter = HTTPAdapter(pool_connections=size, pool_maxsize=size)
+        session.mount("http://", adapter)
+        session.mount("https://", adapter)
+        SESSION["session"] = session
+    return SESSION["session"]
+
+
+def set_pool_size(pool_size: int = POOL_SIZE):
+    """
+    Sets the number of hosts and connections per host kept in the pool.
+    Closes the current session so the next request uses the new size.
+
+    Parameters:
+        pool_size (int): Number of pooled connections
+    """
+    if pool_size is None or pool_size < 1:
+        pool_size = POOL_SIZE
+    SESSION["pool_size"] = pool_size
+    close_session()
+
+
+def close_session():
+    """
+    Closes the shared HTTP session and all of its pooled connections.
+    """
+    if SESSION["session"] is not None:
+        SESSION["session"].close()
+        SESSION["session"] = None
+
+
+def get_connection_stats() -> dict:
+    """
+    Returns how many requests were made on the shared session and how many
+    new connections they needed, for the hosts currently in the pool.
+
+    Returns:
+        dict: Numbers of "requests", "connections" and "reused" requests
+    """
+    stats = {"requests": 0, "connections": 0, "reused": 0}
+    if SESSION["session"] is None:
+        return stats
+    adapter = SESSION["session"].get_adapter("https://")
+    pools = adapter.poolmanager.pools
+    for key in pools.keys():
+        pool = pools.get(key)
+        if pool is not None:
+            stats["requests"] = stats["requests"] + pool.num_requests
+            stats["connections"] = stats["connections"] + pool.num_connections
+    stats["reused"] = stats["requests"] - stats["connections"]
+    return stats
+
+
+def bs_connect(url: str = None, encoding: str = "utf-8") -> BeautifulSoup:
+    """
+    Connects to a URL with the shared session and returns a BeautifulSoup
+    object. Incapable of working with JavaScript.
+
+    Parameters:
+        url (str): URL to retrieve
+        encoding (str): Text encoding to use
+
+    Returns:
+        BeautifulSoup: BeautifulSoup object of the url page
+    """
+    if url is None or url == "":
+        return None
+    if is_replaying():
+        response = get_cassette().get_response("page", url)
+        if response is None:
+            return None
+        html = response["body"].decode("utf-8")
+        return BeautifulSoup(html, features="lxml")
+    try:
+        start = monotonic()
+        request = get_session().get(url)
+        if encoding is None:
+            request.encoding = request.apparent_encoding
+        else:
+            request.encoding = encoding
+        html = request.text
+        if get_cassette() is not None:
+            get_cassette().add_response(
+                "page", url, html.encode("utf-8"),
+                request.headers, monotonic() - start)
+    except (exceptions.ConnectionError,
+            exceptions.MissingSchema,
+            exceptions.InvalidURL,
+            ConnectionResetError):
+        return None
+    if html is None or html == "":
+        return None
+    return BeautifulSoup(html, features="lxml")
+
+
+def get_part_file(file: Path = None) -> Path:
+    """
+    Returns the path of the partial file used while downloading a file.
+
+    Parameters:
+        file (Path): Path of the finished file
+
+    Returns:
+        Path: Path of the partial file
+    """
+    if file is None:
+        return None
+    return Path(str(file.absolute()) + ".part")
+
+
+def get_validator_file(file: Path = None) -> Path:
+    """
+    Returns the path of the file holding the validator of a partial file.
+
+    Parameters:
+        file (Path): Path of the finished file
+
+    Returns:
+        Path: Path of the validator file
+    """
+    if file is None:
+        return None
+    return Path(str(get_part_file(file)) + ".validator")
+
+
+def get_validator(headers: dict = None) -> str:
+    """
+    Returns the value to send as If-Range when resuming a response.
+    Weak ETags can't be used with If-Range, so Last-Modified is used
+    instead if the response has no strong ETag.
+
+    Parameters:
+        headers (dict): Response headers
+
+    Returns:
+        str: Strong ETag or Last-Modified date, None if neither is given
+    """
+    if headers is None:
+        return None
+    etag = headers.get("ETag")
+    if etag is not None and not etag.startswith("W/"):
+        return etag
+    return headers.get("Last-Modified")
+
+
+def get_range_start(headers: dict = None) -> int:
+    """
+    Returns the first byte of a partial response from its Content-Range.
+
+    Parameters:
+        headers (dict): Response headers
+
+    Returns:
+        int: First byte of the response, -1 if invalid
+    """
+    if headers is None:
+        return -1
+    content_range = headers.get("Content-Range")
+    if content_range is None or not content_range.startswith("bytes "):
+        return -1
+    try:
+        return int(content_range[6:content_range.index("-")])
+    except ValueError:
+        return -1
+
+
+def download(
+        url: str = None,
+        filename: str = None,
+        bucket: TokenBucket = None) -> dict:
+    """
+    Downloads a file from a given url to a given file path
+    using the shared session.
+    The file is streamed to disk in chunks and hashed as it is written.
+    If an earlier download of the file was interrupted, it is resumed
+    from the partial file with a range request, as long as the file on
+    the server still matches the validator stored with the partial file.
+
+    Parameters:
+        url (str): URL from which to download
+        filename (str): File path to save to
+        bucket (TokenBucket): Bandwidth limit charged for each chunk,
+                              unless replaying from a cassette
+
+    Returns:
+        dict: Response headers, empty if the download failed
+    """
+    if (url is None
+            or url == ""
+            or filename is None
+            or filename == ""):
+        return dict()
+    file = Path(filename)
+    if file.exists():
+        extension = get_extension(filename)
+        base = filename[0:len(filename) - len(extension)]
+        num = 1
+        while file.exists():
+            file = Path(base + "(" + str(num) + ")" + extension)
+            num = num + 1
+    part = get_part_file(file)
+    validator_file = get_validator_file(file)
+    hasher = sha256()
+    if is_replaying():
+        response = get_cassette().get_response("media", url)
+        if response is None:
+            print("Failed to download:" + url)
+            return dict()
+        # NO BANDWIDTH LIMIT, AS NOTHING IS DOWNLOADED
+        body = response["body"]
+        with open(str(part.absolute()), "wb") as f:
+            for i in range(0, len(body), CHUNK_SIZE):
+                chunk = body[i:i + CHUNK_SIZE]
+                f.write(chunk)
+                hasher.update(chunk)
+        replace(str(part.absolute()), str(file.absolute()))
+        add_hash(file, hasher.hexdigest())
+        return response["headers"]
+    try:
+        start = monotonic()
+        # RESUME FROM PARTIAL FILE
+        offset = 0
+        headers = dict()
+        if part.is_file() and validator_file.is_file():
+            offset = part.stat().st_size
+        if offset > 0:
+            headers["Range"] = "bytes=" + str(offset) + "-"
+            headers["If-Range"] = validator_file.read_text()
+        response = get_session().get(url, headers=headers, stream=True)
+        if response.status_code == 416:
+            response.close()
+            offset = 0
+            response = get_session().get(url, stream=True)
+        if (response.status_code == 206
+                and offset > 0
+                and get_range_start(response.headers) == offset):
+            mode = "ab"
+            with open(str(part.absolute()), "rb") as in_file:
+                for chunk in iter(lambda: in_file.read(CHUNK_SIZE), b""):
+                    hasher.update(chunk)
+        elif response.status_code == 200:
+            mode = "wb"
+            offset = 0
+            # KEEP THE VALIDATOR FOR RESUMING THIS DOWNLOAD
+            validator = get_validator(response.headers)
+            if validator is None:
+                if validator_file.is_file():
+                    remove(str(validator_file.absolute()))
+            else:
+                validator_file.write_text(validator)
+        else:
+            response.close()
+            print("Failed to download:" + url)
+            return dict()
+        # STREAM TO DISK
+        received = 0
+        with open(str(part.absolute()), mode) as f:
+            for chunk in response.iter_content(CHUNK_SIZE):
+                f.write(chunk)
+                hasher.update(chunk)
+                received = received + len(chunk)
+                if bucket is not None:
+                    bucket.consume(len(chunk))
+        length = response.headers.get("Content-Length")
+        if length is not None and received < int(length):
+            print("Failed to download:" + url)
+            return dict()
+        replace(str(part.absolute()), str(file.absolute()))
+        if validator_file.is_file():
+            remove(str(validator_file.absolute()))
+        add_hash(file, hasher.hexdigest())
+        if get_cassette() is not None:
+            get_cassette().add_file_response(
+                "media", url, file,
+                response.headers, monotonic() - start)
+        return response.headers
+    except (HTTPError,
+            exceptions.ConnectionError,
+            exceptions.ChunkedEncodingError,
+            exceptions.MissingSchema,
+            exceptions.InvalidURL,
+            ConnectionResetError):
+        print("Failed to download:" + url)
+    return dict()
+
+
+def write_media(
+        dvk: Dvk = None,
+        get_time: bool = False,
+        bucket: TokenBucket = None):
+    """
+    Downloads the media files of a Dvk with the shared session and writes
+    the DVK file, as Dvk.write_media does.
+    The DVK file is only written once all its media is downloaded, so an
+    interrupted download is resumed on the next run instead of skipped.
+    Nothing is writen if DVK or media URLs are invalid.
+
+    Parameters:
+        dvk (Dvk): Dvk to write
+        get_time (bool): Whether to get the last modified time of URL
+                         for the DVK's time published
+        bucket (TokenBucket): Bandwidth limit for the downloads
+    """
+    if dvk is None or not dvk.can_write():
+        return
+    # DOWNLOAD MEDIA FILE
+    mf = str(dvk.get_media_file().absolute())
+    headers = download(dvk.get_direct_url(), mf, bucket)
+    if not dvk.get_media_file().exists():
+        return
+    # DOWNLOAD SECONDARY FILE
+    if dvk.get_secondary_url() is not None:
+        download(
+            dvk.get_secondary_url(),
+            str(dvk.get_secondary_file().absolute()),
+            bucket)
+        if not dvk.get_secondary_file().exists():
+            remove(str(dvk.get_media_file().absolute()))
+            return
+    if get_time:
+        dvk.set_time(get_last_modified(headers))
+    dvk.write_dvk()
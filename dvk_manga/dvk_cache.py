@@ -0,0 +1,248 @@
+from os import getpid
+from os import scandir
+from os import replace
+from socket import gethostname
+from json import dump
+from json import load
+from pathlib import Path
+from tqdm import tqdm
+from json.decoder import JSONDecodeError
+from dvk_archive.file.dvk import Dvk
+from dvk_archive.file.dvk_handler import DvkHandler
+
+CACHE_NAME = "dvk_manga_cache.json"
+CACHE_VERSION = 1
+# DVK FIELDS STORED IN THE CACHE, IN ORDER
+FIELDS = [
+    "id", "title", "artists", "time", "web_tags", "description",
+    "page_url", "direct_url", "secondary_url", "media_file",
+    "secondary_file", "previous_ids", "next_ids", "section_first",
+    "section_last", "sequence_title", "section_title", "branch_titles",
+    "rating", "views", "user_tags"]
+# FIELDS HOLDING MEDIA FILE PATHS
+FILE_FIELDS = ["media_file", "secondary_file"]
+
+
+def dvk_to_list(dvk: Dvk = None) -> list:
+    """
+    Returns the values of a Dvk object as a list in the order of FIELDS.
+
+    Parameters:
+        dvk (Dvk): Dvk object to convert
+
+    Returns:
+        list: List of Dvk values
+    """
+    if dvk is None:
+        return []
+    values = []
+    for field in FIELDS:
+        value = getattr(dvk, "get_" + field)()
+        if isinstance(value, Path):
+            value = value.name
+        values.append(value)
+    return values
+
+
+def list_to_dvk(values: list = None, dvk_file: Path = None) -> Dvk:
+    """
+    Returns a Dvk object built from a list of values in the order of FIELDS.
+    The values are already normalized by the Dvk getters, so they are
+    assigned directly instead of going through the Dvk setters, which
+    would parse and escape them all over again.
+
+    Parameters:
+        values (list): List of Dvk values, as returned by dvk_to_list
+        dvk_file (Path): Path of the DVK file
+
+    Returns:
+        Dvk: Dvk object with the given values
+    """
+    if values is None or not len(values) == len(FIELDS):
+        dvk = Dvk()
+        dvk.set_file(dvk_file)
+        return dvk
+    dvk = Dvk.__new__(Dvk)
+    attributes = dvk.__dict__
+    attributes["dvk_file"] = None
+    if dvk_file is not None and not dvk_file == "":
+        attributes["dvk_file"] = Path(dvk_file)
+    for i in range(0, len(FIELDS)):
+        value = values[i]
+        if isinstance(value, list):
+            value = list(value)
+        attributes[FIELDS[i]] = value
+    # MEDIA FILES ARE STORED AS NAMES RELATIVE TO THE DVK FILE
+    for field in FILE_FIELDS:
+        name = attributes[field]
+        attributes[field] = None
+        if (name is not None
+                and not name == ""
+                and attributes["dvk_file"] is not None):
+            parent = attributes["dvk_file"].parent
+            attributes[field] = parent.joinpath(name).absolute()
+    return dvk
+
+
+class DvkCache:
+    """
+    Cache of parsed DVK metadata for all the DVK files under a directory.
+    Entries are keyed by relative path and invalidated when the size or
+    modification time of the DVK file changes.
+
+    Attributes:
+        directory (Path): Base directory of the cached DVK files
+        entries (dict): Cached [size, mtime, values] lists by relative path
+        used (dict): Entries used since the cache was read
+        changed (bool): Whether the cache needs to be written
+    """
+
+    def __init__(self, directory_str: str = None):
+        """
+        Initializes DvkCache attributes.
+
+        Parameters:
+            directory_str (str): Base directory of the cached DVK files
+        """
+        self.directory = None
+        if directory_str is not None and not directory_str == "":
+            self.directory = Path(directory_str).absolute()
+        self.entries = dict()
+        self.used = dict()
+        self.changed = False
+
+    def get_cache_file(self) -> Path:
+        """
+        Returns the path of the cache file.
+
+        Returns:
+            Path: Cache file path
+        """
+        if self.directory is None:
+            return None
+        return self.directory.joinpath(CACHE_NAME)
+
+    def read_cache(self):
+        """
+        Reads the cache file, if it exists and is the current version.
+        """
+        self.entries = dict()
+        self.used = dict()
+        self.changed = False
+        file = self.get_cache_file()
+        if file is None or not file.is_file():
+            return
+        try:
+            with open(file.absolute()) as in_file:
+                data = load(in_file)
+            if data["version"] == CACHE_VERSION:
+                self.entries = data["entries"]
+        except (IOError, JSONDecodeError, KeyError, TypeError):
+            self.entries = dict()
+
+    def write_cache(self):
+        """
+        Writes the entries used since reading to the cache file.
+        Entries for DVK files that were not seen are dropped.
+        """
+        file = self.get_cache_file()
+        if (file is None
+                or not self.directory.is_dir()
+                or (not self.changed
+                    and len(self.used) == len(self.entries))):
+            return
+        data = {"version": CACHE_VERSION, "entries": self.used}
+        # UNIQUE TEMPORARY FILE, AS SEVERAL HOSTS MAY SHARE THE DIRECTORY
+        temp = self.directory.joinpath(
+            CACHE_NAME + "." + gethostname() + "-" + str(getpid()) + ".tmp")
+        try:
+            with open(temp.absolute(), "w") as out_file:
+                dump(data, out_file, separators=(",", ":"))
+            replace(str(temp.absolute()), str(file.absolute()))
+            self.entries = self.used
+            self.changed = False
+        except IOError as e:
+            print("File error: " + str(e))
+
+    def get_dvk(self, dvk_file: Path = None, stat=None) -> Dvk:
+        """
+        Returns the Dvk object for a given DVK file.
+        Uses the cached values if the file is unchanged, otherwise
+        parses the file and updates the cache.
+
+        Parameters:
+            dvk_file (Path): Path of the DVK file
+            stat (os.stat_result): Stat of the DVK file, if already known
+
+        Returns:
+            Dvk: Dvk object for the given file
+        """
+        if dvk_file is None:
+            return Dvk()
+        dvk_file = Path(dvk_file).absolute()
+        try:
+            key = str(dvk_file.relative_to(self.directory))
+        except (TypeError, ValueError):
+            key = str(dvk_file)
+        if stat is None:
+            stat = dvk_file.stat()
+        entry = self.entries.get(key)
+        if (entry is not None
+                and entry[0] == stat.st_size
+                and entry[1] == stat.st_mtime_ns):
+            self.used[key] = entry
+            return list_to_dvk(entry[2], dvk_file)
+        dvk = Dvk()
+        dvk.set_file(dvk_file)
+        dvk.read_dvk()
+        self.used[key] = [stat.st_size, stat.st_mtime_ns, dvk_to_list(dvk)]
+        self.changed = True
+        return dvk
+
+
+class CachedDvkHandler(DvkHandler):
+    """
+    DvkHandler that only parses DVK files that are new or changed since
+    the last load, reading the rest from a DvkCache in each directory.
+    """
+
+    def load_dvks(self, directory_strs: list = None):
+        """
+        Loads DVK files from a given directory and sub-directories.
+
+        Parameters:
+            directory_strs (list): Directories from which to load DVK files
+        """
+        self.dvks = []
+        self.paths = self.get_directories(directory_strs)
+        caches = []
+        if directory_strs is not None:
+            for directory_str in directory_strs:
+                if directory_str is not None and not directory_str == "":
+                    cache = DvkCache(directory_str)
+                    cache.read_cache()
+                    caches.append(cache)
+        print("Loading DVK Files:")
+        for path in tqdm(self.paths):
+            path = path.absolute()
+            cache = None
+            for item in caches:
+                if (path == item.directory
+                        or item.directory in path.parents):
+                    cache = item
+                    break
+            with scandir(path) as entries:
+                for entry in entries:
+                    if (not entry.name.endswith(".dvk")
+                            or not entry.is_file()):
+                        continue
+                    if cache is None:
+                        dvk = Dvk()
+                        dvk.set_file(entry.path)
+                        dvk.read_dvk()
+                    else:
+                        dvk = cache.get_dvk(Path(entry.path), entry.stat())
+                    self.dvks.append(dvk)
+        for cache in caches:
+            cache.write_cache()
+        self.reset_sorted()
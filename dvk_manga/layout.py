@@ -0,0 +1,278 @@
+from os import rename
+from os import rmdir
+from os import remove
+from os import listdir
+from pathlib import Path
+from tqdm import tqdm
+from argparse import ArgumentParser
+from dvk_archive.file.dvk import Dvk
+from dvk_archive.file.dvk_handler import DvkHandler
+from dvk_manga.dvk_cache import CACHE_NAME
+from dvk_manga.verify import add_hash
+from dvk_manga.verify import read_hashes
+from dvk_manga.verify import remove_stale_hashes
+
+FLAT = "flat"
+TITLE = "title"
+CHAPTER = "chapter"
+LAYOUTS = [FLAT, TITLE, CHAPTER]
+
+
+def get_title_id_from_dvk(dvk: Dvk = None) -> str:
+    """
+    Returns the MangaDex title ID stored in a Dvk's web tags.
+
+    Parameters:
+        dvk (Dvk): Dvk with MangaDex title information
+
+    Returns:
+        str: MangaDex title ID number, empty if not found
+    """
+    if dvk is None or dvk.get_web_tags() is None:
+        return ""
+    for tag in dvk.get_web_tags():
+        if tag.lower().startswith("mangadex:"):
+            return tag[len("MangaDex:"):]
+    return ""
+
+
+def get_chapter_id_from_dvk(dvk: Dvk = None) -> str:
+    """
+    Returns the MangaDex chapter ID from the ID of a MangaDex page Dvk.
+    Page Dvk IDs have the form MDX<chapter ID>-<page number>.
+
+    Parameters:
+        dvk (Dvk): Dvk for a MangaDex page
+
+    Returns:
+        str: MangaDex chapter ID number, empty if not found
+    """
+    if dvk is None or not dvk.get_id().startswith("MDX"):
+        return ""
+    chapter_id = dvk.get_id()[3:]
+    if "-" in chapter_id:
+        chapter_id = chapter_id[:chapter_id.index("-")]
+    return chapter_id
+
+
+def get_title_directory(
+        directory: Path = None,
+        title_id: str = None,
+        layout: str = FLAT) -> Path:
+    """
+    Returns the directory holding all the files for a given MangaDex title.
+
+    Parameters:
+        directory (Path): Base directory of the archive
+        title_id (str): MangaDex title ID number
+        layout (str): Directory layout of the archive
+
+    Returns:
+        Path: Directory for the given title
+    """
+    if directory is None:
+        return None
+    directory = Path(directory)
+    if layout == FLAT or title_id is None or title_id == "":
+        return directory
+    return directory.joinpath(title_id)
+
+
+def get_page_directory(
+        directory: Path = None,
+        title_id: str = None,
+        chapter_id: str = None,
+        layout: str = FLAT) -> Path:
+    """
+    Returns the directory in which to save a MangaDex page.
+
+    Parameters:
+        directory (Path): Base directory of the archive
+        title_id (str): MangaDex title ID number
+        chapter_id (str): MangaDex chapter ID number
+        layout (str): Directory layout of the archive
+
+    Returns:
+        Path: Directory for the given page
+    """
+    title_dir = get_title_directory(directory, title_id, layout)
+    if (title_dir is None
+            or not layout == CHAPTER
+            or title_id is None
+            or title_id == ""
+            or chapter_id is None
+            or chapter_id == ""):
+        return title_dir
+    return title_dir.joinpath(chapter_id)
+
+
+def get_layout_titles(directory: Path = None) -> list:
+    """
+    Returns the MangaDex title IDs present in a sharded archive.
+    Reads only the title directory names, without loading any DVKs.
+
+    Parameters:
+        directory (Path): Base directory of the archive
+
+    Returns:
+        list: Sorted list of MangaDex title IDs
+    """
+    if directory is None or not Path(directory).is_dir():
+        return []
+    ids = []
+    for name in listdir(Path(directory).absolute()):
+        if name.isdigit() and Path(directory).joinpath(name).is_dir():
+            ids.append(name)
+    return sorted(ids, key=int)
+
+
+def move_dvk(
+        dvk: Dvk = None,
+        directory: Path = None,
+        hashes: dict = None) -> bool:
+    """
+    Moves a Dvk file and its linked media files into a given directory.
+    Stored media hashes are copied to the hash file of the new directory.
+    Nothing is moved if any of the files already exist in the directory.
+
+    Parameters:
+        dvk (Dvk): Dvk to move
+        directory (Path): Directory to move the Dvk into
+        hashes (dict): Stored media hashes of the Dvk's current directory,
+                       read from its hash file if None
+
+    Returns:
+        bool: Whether the files were moved
+    """
+    if (dvk is None
+            or directory is None
+            or dvk.get_file() is None
+            or not dvk.get_file().exists()):
+        return False
+    files = [dvk.get_file()]
+    for file in [dvk.get_media_file(), dvk.get_secondary_file()]:
+        if file is not None and file.exists():
+            files.append(file)
+    directory = Path(directory)
+    for file in files:
+        if directory.joinpath(file.name).exists():
+            return False
+    directory.mkdir(parents=True, exist_ok=True)
+    if hashes is None:
+        hashes = read_hashes(dvk.get_file().parent)
+    for file in files:
+        rename(file.absolute(), directory.joinpath(file.name).absolute())
+        add_hash(directory.joinpath(file.name), hashes.get(file.name))
+    media = dvk.get_media_file()
+    secondary = dvk.get_secondary_file()
+    dvk.set_file(directory.joinpath(dvk.get_file().name).absolute())
+    if media is not None:
+        dvk.set_media_file(media.name)
+    if secondary is not None:
+        dvk.set_secondary_file(secondary.name)
+    return True
+
+
+def remove_empty_directories(directories: list = None, base: Path = None):
+    """
+    Removes the given directories and their parents if they are empty.
+    Directories holding only a DVK cache file count as empty.
+    Never removes the base directory or anything outside of it.
+
+    Parameters:
+        directories (list): Directories to remove if empty
+        base (Path): Base directory of the archive
+    """
+    if directories is None or base is None:
+        return
+    base = Path(base).absolute()
+    for directory in sorted(directories, key=lambda d: -len(d.parts)):
+        directory = Path(directory).absolute()
+        while base in directory.parents and directory.is_dir():
+            names = listdir(directory)
+            if names == [CACHE_NAME]:
+                remove(str(directory.joinpath(CACHE_NAME).absolute()))
+            elif len(names) > 0:
+                break
+            rmdir(directory)
+            directory = directory.parent
+
+
+def migrate_layout(directory_str: str = None, layout: str = FLAT) -> int:
+    """
+    Moves the MangaDex files of an existing archive into a given layout.
+    DVKs without MangaDex title information are left in place, as are
+    DVKs whose files already exist in the target directory.
+
+    Parameters:
+        directory_str (str): Base directory of the archive
+        layout (str): Directory layout to migrate to
+
+    Returns:
+        int: Number of DVKs moved
+    """
+    if (directory_str is None
+            or layout not in LAYOUTS
+            or not Path(directory_str).is_dir()):
+        return 0
+    directory = Path(directory_str).absolute()
+    dvk_handler = DvkHandler()
+    dvk_handler.load_dvks([str(directory)])
+    moved = 0
+    parents = []
+    skipped = []
+    hashes = dict()
+    print("Migrating Files:")
+    for i in tqdm(range(0, dvk_handler.get_size())):
+        dvk = dvk_handler.get_dvk_direct(i)
+        if "/mangadex." not in str(dvk.get_page_url()).lower():
+            continue
+        title_id = get_title_id_from_dvk(dvk)
+        if title_id == "":
+            continue
+        page_dir = get_page_directory(
+            directory,
+            title_id,
+            get_chapter_id_from_dvk(dvk),
+            layout)
+        if str(dvk.get_file().parent.absolute()) == str(page_dir.absolute()):
+            continue
+        parent = dvk.get_file().parent.absolute()
+        if str(parent) not in hashes:
+            hashes[str(parent)] = read_hashes(parent)
+        if move_dvk(dvk, page_dir, hashes[str(parent)]):
+            moved = moved + 1
+            if parent not in parents:
+                parents.append(parent)
+        else:
+            skipped.append(dvk.get_file())
+    for file in skipped:
+        print("Skipped, files already exist in target: " + str(file))
+    if len(skipped) > 0:
+        print("Skipped " + str(len(skipped)) + " DVK files.")
+    for parent in parents:
+        remove_stale_hashes(parent)
+    remove_empty_directories(parents, directory)
+    return moved
+
+
+def main():
+    parser = ArgumentParser()
+    parser.add_argument(
+        "directory",
+        help="Directory of the archive to migrate.",
+        type=str)
+    parser.add_argument(
+        "-y",
+        "--layout",
+        help="Directory layout to migrate to (defaults to \"title\")",
+        choices=LAYOUTS,
+        type=str,
+        default=TITLE)
+    args = parser.parse_args()
+    moved = migrate_layout(str(Path(args.directory)), str(args.layout))
+    print("Moved " + str(moved) + " DVK files.")
+
+
+if __name__ == "__main__":
+    main()
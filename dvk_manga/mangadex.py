@@ -1,4 +1,8 @@
+from os import getpid
 from os import getcwd
+from socket import gethostname
+from threading import Event
+from threading import Thread
 from re import compile
 from tqdm import tqdm
 from time import sleep
@@ -7,11 +11,42 @@ from argparse import ArgumentParser
 from dvk_archive.file.dvk import Dvk
 from dvk_archive.file.dvk_handler import DvkHandler
 from dvk_archive.processing.string_processing import get_extension
-from dvk_archive.web.basic_connect import bs_connect
 from dvk_archive.web.basic_connect import remove_header_footer
 from dvk_archive.web.heavy_connect import HeavyConnect
 from dvk_archive.processing.html_processing import replace_escapes
 from dvk_archive.processing.list_processing import clean_list
+from dvk_manga.cassette import RECORD
+from dvk_manga.cassette import REPLAY
+from dvk_manga.cassette import Cassette
+from dvk_manga.cassette import get_connect
+from dvk_manga.cassette import set_cassette
+from dvk_manga.cassette import is_replaying
+from dvk_manga.connect import POOL_SIZE
+from dvk_manga.connect import bs_connect
+from dvk_manga.connect import write_media
+from dvk_manga.connect import set_pool_size
+from dvk_manga.connect import close_session
+from dvk_manga.connect import get_connection_stats
+from dvk_manga.dvk_cache import CachedDvkHandler
+from dvk_manga.layout import FLAT
+from dvk_manga.layout import LAYOUTS
+from dvk_manga.layout import get_layout_titles
+from dvk_manga.layout import get_page_directory
+from dvk_manga.layout import get_title_directory
+from dvk_manga.layout import get_title_id_from_dvk
+from dvk_manga.scheduler import TokenBucket
+from dvk_manga.scheduler import DownloadScheduler
+from dvk_manga.work_queue import LEASE_SECONDS
+from dvk_manga.work_queue import MAX_ATTEMPTS
+from dvk_manga.work_queue import WorkQueue
+from dvk_manga.work_queue import keep_lease
+from dvk_manga.verify import verify_archive
+from dvk_manga.verify import has_all_files
+from dvk_manga.verify import remove_dvk_files
+from dvk_manga.verify import restore_dvk_files
+from dvk_manga.verify import quarantine_dvk_files
+from dvk_manga.verify import remove_quarantined_files
+from dvk_manga.verify import get_repair_chapters
 
 
 def get_title_id(url: str = None) -> str:
@@ -117,7 +152,8 @@ def get_title_info(title_num: str = None) -> Dvk:
     dvk.set_page_url("https://mangadex.cc/title/" + title_num + "/")
     print("Finding Chapters...")
     bs = bs_connect(dvk.get_page_url())
-    sleep(1)
+    if not is_replaying():
+        sleep(1)
     try:
         # GET TITLE
         title = replace_escapes(bs.find("span", {"class": "mx-1"}).get_text())
@@ -181,7 +217,8 @@ def get_chapters(
     if base_dvk is None or base_dvk.page_url is None:
         return dvks
     bs = bs_connect(base_dvk.get_page_url() + "chapters/" + str(page_num))
-    sleep(1)
+    if not is_replaying():
+        sleep(1)
     try:
         bs_list = bs.findAll("span", {"title": language})
     except AttributeError:
@@ -271,14 +308,40 @@ def get_start_chapter(
     return start_chapter
 
 
+def get_base_directory(directory: Path = None, layout: str = FLAT) -> str:
+    """
+    Returns the base directory to pass to get_dvks for a given layout.
+    Flat archives save to the first directory of the DvkHandler, as they
+    always have, so None is returned for them.
+
+    Parameters:
+        directory (Path): Base directory of the archive
+        layout (str): Directory layout of the archive
+
+    Returns:
+        str: Base directory of the archive, None for the flat layout
+    """
+    if directory is None or layout == FLAT:
+        return None
+    return str(Path(directory).absolute())
+
+
 def get_dvks(
         dvk_handler: DvkHandler = None,
         chapters: list = None,
         save: bool = True,
-        check_all: bool = False) -> list:
+        check_all: bool = False,
+        layout: str = FLAT,
+        directory_str: str = None,
+        connect: HeavyConnect = None,
+        bucket: TokenBucket = None,
+        broken: dict = None,
+        abandon: Event = None) -> list:
     """
     Returns list of Dvk objects for each page in given MangaDex chapters.
     Downloads Dvks if specified.
+    Broken pages are treated as missing, and their old files are only
+    replaced once the new download succeeds.
 
     Parameters:
         dvk_handler (DvkHandler): DvkHandler for seeing which files
@@ -288,6 +351,17 @@ def get_dvks(
         save (bool): Whether to download images and save Dvk objects
         check_all (bool): Whether to check all chapters,
                           not just newest chapters
+        layout (str): Directory layout of the archive
+        directory_str (str): Base directory of the archive.
+                             Defaults to the first DvkHandler path.
+        connect (HeavyConnect): Browser connection to reuse.
+                                If None, one is opened and closed.
+                                May also be a CassetteConnect.
+        bucket (TokenBucket): Bandwidth limit for media downloads
+        broken (dict): Dvks with broken media files to download again,
+                       by DVK ID
+        abandon (Event): Event that stops the download when set,
+                         checked before each page
 
     Returns:
         list: List of Dvk objects for MangaDex pages
@@ -298,15 +372,25 @@ def get_dvks(
             or len(chapters) == 0):
         return []
     directory = dvk_handler.get_paths()[0]
+    if directory_str is not None:
+        directory = Path(directory_str)
+    if broken is None:
+        broken = dict()
     print("Downloading pages:")
     start_chapter = get_start_chapter(dvk_handler, chapters, check_all)
     # GET DVKS
     dvks = []
-    connect = HeavyConnect()
+    close = connect is None
+    if close:
+        connect = get_connect()
     for chp in tqdm(range(start_chapter, -1, -1)):
+        if abandon is not None and abandon.is_set():
+            break
         page = 1
         c_id = chapters[chp].get_id()
-        while True:
+        title_id = get_title_id_from_dvk(chapters[chp])
+        page_dir = get_page_directory(directory, title_id, c_id, layout)
+        while abandon is None or not abandon.is_set():
             # FIND IMAGE URL
             dvk = Dvk()
             dvk.set_id("MDX" + chapters[chp].get_id() + "-" + str(page))
@@ -316,11 +400,13 @@ def get_dvks(
             dvk.set_web_tags(chapters[chp].get_web_tags())
             dvk.set_description(chapters[chp].get_description())
             dvk.set_page_url(chapters[chp].get_page_url() + str(page))
-            dvk.set_file(directory.joinpath(dvk.get_filename() + ".dvk"))
+            dvk.set_file(page_dir.joinpath(dvk.get_filename() + ".dvk"))
             contains = False
             chapter_id = get_chapter_id(dvk.get_page_url())
             size = dvk_handler.get_size()
             for i in range(0, size):
+                if dvk_handler.get_dvk_direct(i).get_id() in broken:
+                    continue
                 page_sect = dvk_handler.get_dvk_direct(i).get_page_url()
                 if "/mangadex." in page_sect:
                     page_sect = page_sect[len(page_sect) - len(chapter_id):]
@@ -354,9 +440,22 @@ def get_dvks(
                 dvks.append(dvk)
                 # DOWNLOAD IF SPECIFIED
                 if save:
-                    dvk.write_media()
+                    page_dir.mkdir(parents=True, exist_ok=True)
+                    # KEEP BROKEN FILES UNTIL REPLACED
+                    moved = quarantine_dvk_files(broken.get(dvk.get_id()))
+                    replaced = False
+                    try:
+                        write_media(dvk, bucket=bucket)
+                        replaced = has_all_files(dvk)
+                    finally:
+                        if replaced:
+                            remove_quarantined_files(moved)
+                        elif len(moved) > 0:
+                            remove_dvk_files(dvk)
+                            restore_dvk_files(moved)
             page = page + 1
-    connect.close_driver()
+    if close:
+        connect.close_driver()
     return dvks
 
 
@@ -364,9 +463,22 @@ def download_mangadex(
         url: str = None,
         directory_str: str = None,
         language: str = None,
-        check_all: bool = False):
+        check_all: bool = False,
+        layout: str = FLAT,
+        bandwidth: int = 0,
+        pinned: list = None,
+        pool_size: int = POOL_SIZE,
+        cassette: Cassette = None,
+        verify: bool = False,
+        processes: int = None,
+        queue_str: str = None):
     """
     Downloads files from MangaDex.cc
+    Chapters from all titles are queued first, then downloaded newest
+    first, starting with pinned titles.
+    In verify mode, only chapters with broken pages are downloaded.
+    If a shared work queue is given, chapters are added to it for
+    download workers instead of being downloaded, except in verify mode.
 
     Parameters:
         url (str): MangaDex title URL
@@ -374,14 +486,46 @@ def download_mangadex(
         language (str): Language of files to download
         check_all (bool): Whether to check all chapters,
                           not just newest chapters
+        layout (str): Directory layout of the archive
+        bandwidth (int): Bytes allowed per second, 0 for no limit
+        pinned (list): MangaDex title IDs to download first
+        pool_size (int): Number of pooled HTTP connections per host
+        cassette (Cassette): Cassette to record responses to
+                             or replay them from
+        verify (bool): Whether to verify the archive and re-download
+                       broken pages instead of checking for new chapters
+        processes (int): Number of processes used to verify the archive
+        queue_str (str): Path of a shared SQLite work queue
     """
     dir = Path(directory_str)
     if dir.is_dir():
-        dvk_handler = DvkHandler()
-        dvk_handler.load_dvks([str(dir.absolute())])
+        set_pool_size(pool_size)
+        set_cassette(cassette)
+        dvk_handler = CachedDvkHandler()
+        if layout == FLAT and not verify:
+            dvk_handler.load_dvks([str(dir.absolute())])
+        scheduler = DownloadScheduler(bandwidth, pinned)
         ids = []
         dirs = []
-        if url == "":
+        broken = dict()
+        if verify:
+            # QUEUE CHAPTERS WITH BROKEN PAGES
+            broken_dvks = verify_archive(str(dir.absolute()), processes)
+            for dvk in broken_dvks:
+                broken[dvk.get_id()] = dvk
+            if len(broken_dvks) > 0:
+                dvk_handler.load_dvks([str(dir.absolute())])
+            for chapter in get_repair_chapters(broken_dvks):
+                scheduler.add_chapters(
+                    get_title_id_from_dvk(chapter),
+                    [chapter],
+                    0,
+                    dvk_handler)
+        elif url == "" and not layout == FLAT:
+            ids = get_layout_titles(dir)
+            for id in ids:
+                dirs.append(get_title_directory(dir, id, layout))
+        elif url == "":
             dvks = get_downloaded_titles(dvk_handler)
             for dvk in dvks:
                 for tag in dvk.get_web_tags():
@@ -399,11 +543,153 @@ def download_mangadex(
                 title = get_title_info(ids[i])
                 print(title.get_title())
                 chapters = get_chapters(title, language)
-                get_dvks(
-                    dvk_handler,
+                title_handler = dvk_handler
+                if not layout == FLAT:
+                    # ONLY LOAD THE DVKS FOR THE CURRENT TITLE
+                    title_dir = get_title_directory(dir, ids[i], layout)
+                    title_dir.mkdir(parents=True, exist_ok=True)
+                    title_handler = CachedDvkHandler()
+                    title_handler.load_dvks([str(title_dir.absolute())])
+                start_chapter = get_start_chapter(
+                    title_handler,
                     chapters,
-                    True,
                     check_all)
+                scheduler.add_chapters(
+                    ids[i],
+                    chapters,
+                    start_chapter,
+                    title_handler)
+        # ADD QUEUED CHAPTERS TO SHARED WORK QUEUE
+        # REPAIRS STAY LOCAL, AS WORKERS DON'T KNOW WHICH PAGES ARE BROKEN
+        if queue_str is not None and not verify:
+            work_queue = WorkQueue(queue_str)
+            added = work_queue.add_jobs(scheduler)
+            print("Added " + str(added) + " chapters to the work queue.")
+            work_queue.close()
+        # DOWNLOAD QUEUED CHAPTERS
+        if scheduler.get_size() > 0:
+            base_str = get_base_directory(dir, layout)
+            connect = get_connect()
+            while scheduler.get_size() > 0:
+                job = scheduler.get_next_job()
+                get_dvks(
+                    job.dvk_handler,
+                    [job.chapter],
+                    True,
+                    True,
+                    layout,
+                    base_str,
+                    connect,
+                    scheduler.bucket,
+                    broken)
+            connect.close_driver()
+        stats = get_connection_stats()
+        print("HTTP Requests: " + str(stats["requests"])
+              + ", Connections: " + str(stats["connections"])
+              + ", Reused: " + str(stats["reused"]))
+        close_session()
+        if cassette is not None:
+            cassette.write_cassette()
+        set_cassette(None)
+
+
+def run_worker(
+        queue_str: str = None,
+        directory_str: str = None,
+        layout: str = FLAT,
+        worker: str = None,
+        lease_seconds: float = LEASE_SECONDS,
+        bandwidth: int = 0,
+        pool_size: int = POOL_SIZE,
+        max_attempts: int = MAX_ATTEMPTS):
+    """
+    Downloads chapters from a shared work queue until it is empty.
+    The lease on each chapter is renewed while it downloads, and the
+    chapter is marked as done when finished.
+    If the lease is lost, the chapter is abandoned before the next page,
+    as another worker may claim it.
+
+    Parameters:
+        queue_str (str): Path of the shared SQLite work queue
+        directory_str (str): Directory in which to save files
+        layout (str): Directory layout of the archive
+        worker (str): Name of the worker, defaults to host and process ID
+        lease_seconds (float): Seconds before an unrenewed lease expires
+        bandwidth (int): Bytes allowed per second, 0 for no limit
+        pool_size (int): Number of pooled HTTP connections per host
+        max_attempts (int): Number of times a chapter is claimed before
+                            it is marked as failed
+    """
+    dir = Path(directory_str)
+    if queue_str is None or not dir.is_dir():
+        return
+    if worker is None or worker == "":
+        worker = gethostname() + "-" + str(getpid())
+    set_pool_size(pool_size)
+    work_queue = WorkQueue(queue_str)
+    bucket = TokenBucket(bandwidth)
+    dvk_handler = CachedDvkHandler()
+    if layout == FLAT:
+        dvk_handler.load_dvks([str(dir.absolute())])
+    base_str = get_base_directory(dir, layout)
+    connect = None
+    while True:
+        claimed = work_queue.claim_job(worker, lease_seconds, max_attempts)
+        if claimed is None:
+            break
+        job_id, chapter = claimed
+        print(chapter.get_title())
+        title_handler = dvk_handler
+        if not layout == FLAT:
+            # ONLY LOAD THE DVKS FOR THE CHAPTER'S TITLE
+            title_id = get_title_id_from_dvk(chapter)
+            title_dir = get_title_directory(dir, title_id, layout)
+            title_dir.mkdir(parents=True, exist_ok=True)
+            title_handler = CachedDvkHandler()
+            title_handler.load_dvks([str(title_dir.absolute())])
+        if connect is None:
+            connect = get_connect()
+        stop = Event()
+        lost = Event()
+        thread = Thread(
+            target=keep_lease,
+            args=(queue_str, job_id, worker, lease_seconds, stop, lost))
+        thread.daemon = True
+        thread.start()
+        try:
+            get_dvks(
+                title_handler,
+                [chapter],
+                True,
+                True,
+                layout,
+                base_str,
+                connect,
+                bucket,
+                None,
+                lost)
+        except BaseException:
+            stop.set()
+            thread.join()
+            work_queue.release_job(job_id, worker)
+            raise
+        stop.set()
+        thread.join()
+        if lost.is_set():
+            print("Abandoned chapter after losing its lease: "
+                  + chapter.get_title())
+        elif not work_queue.complete_job(job_id, worker):
+            print("Lost lease before marking chapter as done: "
+                  + chapter.get_title())
+    if connect is not None:
+        connect.close_driver()
+    counts = work_queue.get_counts()
+    print("Work Queue - Queued: " + str(counts["queued"])
+          + ", Leased: " + str(counts["leased"])
+          + ", Done: " + str(counts["done"])
+          + ", Failed: " + str(counts["failed"]))
+    work_queue.close()
+    close_session()
 
 
 def main():
@@ -433,12 +719,114 @@ def main():
         "--check_all",
         help="Checks for images in all chapters, even if already downloaded.",
         action="store_true")
+    parser.add_argument(
+        "-y",
+        "--layout",
+        help="Directory layout of the archive (defaults to \"flat\")",
+        choices=LAYOUTS,
+        type=str,
+        default=FLAT)
+    parser.add_argument(
+        "-b",
+        "--bandwidth",
+        help="Maximum bytes per second to download (defaults to no limit)",
+        type=int,
+        default=0)
+    parser.add_argument(
+        "-p",
+        "--pin",
+        help="MangaDex title IDs to download before other titles.",
+        nargs="*",
+        type=str,
+        default=[])
+    parser.add_argument(
+        "-o",
+        "--pool",
+        help="Number of pooled HTTP connections per host (defaults to "
+        + str(POOL_SIZE) + ")",
+        type=int,
+        default=POOL_SIZE)
+    parser.add_argument(
+        "--record",
+        help="Records all responses to a given cassette file.",
+        type=str,
+        default=None)
+    parser.add_argument(
+        "--replay",
+        help="Replays all responses from a given cassette file, offline.",
+        type=str,
+        default=None)
+    parser.add_argument(
+        "--replay_latency",
+        help="Waits for the recorded latency of each replayed response.",
+        action="store_true")
+    parser.add_argument(
+        "-v",
+        "--verify",
+        help="Verifies downloaded images and re-downloads broken pages.",
+        action="store_true")
+    parser.add_argument(
+        "--processes",
+        help="Number of processes used to verify images "
+        + "(defaults to the number of CPUs)",
+        type=int,
+        default=None)
+    parser.add_argument(
+        "-q",
+        "--queue",
+        help="Shared work queue file to add chapters to, "
+        + "or to take chapters from with --worker.",
+        type=str,
+        default=None)
+    parser.add_argument(
+        "-w",
+        "--worker",
+        help="Downloads chapters from the shared work queue until empty.",
+        action="store_true")
+    parser.add_argument(
+        "--lease",
+        help="Seconds before an unrenewed worker lease expires "
+        + "(defaults to " + str(LEASE_SECONDS) + ")",
+        type=float,
+        default=LEASE_SECONDS)
+    parser.add_argument(
+        "--attempts",
+        help="Times a worker may claim a chapter before it is marked as "
+        + "failed (defaults to " + str(MAX_ATTEMPTS) + ")",
+        type=int,
+        default=MAX_ATTEMPTS)
     args = parser.parse_args()
     url = str(args.url)
     dir = str(Path(args.directory))
     language = str(args.language)
     check_all = bool(args.check_all)
-    download_mangadex(url, dir, language, check_all)
+    layout = str(args.layout)
+    bandwidth = int(args.bandwidth)
+    pinned = list(args.pin)
+    pool_size = int(args.pool)
+    cassette = None
+    if args.replay is not None:
+        cassette = Cassette(str(args.replay), REPLAY, args.replay_latency)
+        cassette.read_cassette()
+    elif args.record is not None:
+        cassette = Cassette(str(args.record), RECORD)
+    verify = bool(args.verify)
+    if args.worker:
+        if args.queue is None:
+            print("A work queue is required to run a worker.")
+            return
+        set_cassette(cassette)
+        run_worker(
+            str(args.queue), dir, layout, None,
+            float(args.lease), bandwidth, pool_size, int(args.attempts))
+        if cassette is not None:
+            cassette.write_cassette()
+        set_cassette(None)
+        return
+    download_mangadex(
+        url, dir, language, check_all, layout,
+        bandwidth, pinned, pool_size, cassette,
+        verify, args.processes, args.queue)
 
 
 if __name__ == "__main__":
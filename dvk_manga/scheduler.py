@@ -0,0 +1,211 @@
+from time import sleep
+from time import monotonic
+from heapq import heappop
+from heapq import heappush
+from dvk_archive.file.dvk import Dvk
+from dvk_archive.file.dvk_handler import DvkHandler
+
+
+def get_time_int(time_str: str = None) -> int:
+    """
+    Returns a DVK time string as an integer that sorts chronologically.
+
+    Parameters:
+        time_str (str): Time in DVK format (YYYY/MM/DD|hh:mm)
+
+    Returns:
+        int: Time as an integer, 0 if invalid
+    """
+    if time_str is None:
+        return 0
+    digits = "".join([c for c in time_str if c.isdigit()])
+    if digits == "":
+        return 0
+    return int(digits)
+
+
+class TokenBucket:
+    """
+    Token bucket for capping the average number of bytes downloaded per
+    second. Downloads larger than the bucket put it in debt, which is
+    paid back by waiting before the next download.
+
+    Attributes:
+        rate (int): Bytes allowed per second, 0 for no limit
+        capacity (int): Maximum bytes that can be used in a burst
+        tokens (float): Bytes currently available
+        last (float): Time of the last refill
+        clock (function): Function returning the current time in seconds
+        wait (function): Function used to wait a given number of seconds
+    """
+
+    def __init__(self, rate: int = 0, capacity: int = None):
+        """
+        Initializes TokenBucket attributes.
+
+        Parameters:
+            rate (int): Bytes allowed per second, 0 for no limit
+            capacity (int): Maximum burst size in bytes, defaults to rate
+        """
+        self.rate = 0
+        if rate is not None and rate > 0:
+            self.rate = rate
+        self.capacity = self.rate
+        if capacity is not None and capacity > 0:
+            self.capacity = capacity
+        self.tokens = float(self.capacity)
+        self.clock = monotonic
+        self.wait = sleep
+        self.last = self.clock()
+
+    def refill(self):
+        """
+        Adds the tokens earned since the last refill.
+        """
+        now = self.clock()
+        self.tokens = self.tokens + ((now - self.last) * self.rate)
+        if self.tokens > self.capacity:
+            self.tokens = float(self.capacity)
+        self.last = now
+
+    def consume(self, amount: int = 0) -> float:
+        """
+        Takes a number of bytes from the bucket, waiting if it is in debt.
+
+        Parameters:
+            amount (int): Number of bytes downloaded
+
+        Returns:
+            float: Seconds spent waiting
+        """
+        if self.rate == 0 or amount is None or amount < 1:
+            return 0.0
+        self.refill()
+        self.tokens = self.tokens - amount
+        if self.tokens >= 0:
+            return 0.0
+        seconds = -self.tokens / self.rate
+        self.wait(seconds)
+        self.refill()
+        return seconds
+
+
+class ChapterJob:
+    """
+    A MangaDex chapter waiting to be downloaded.
+
+    Attributes:
+        chapter (Dvk): Dvk with MangaDex chapter information
+        dvk_handler (DvkHandler): DvkHandler with the title's DVKs
+        rank (int): Position of the chapter from the newest in its title
+        pinned (bool): Whether the chapter's title is pinned
+    """
+
+    def __init__(
+            self,
+            chapter: Dvk = None,
+            dvk_handler: DvkHandler = None,
+            rank: int = 0,
+            pinned: bool = False):
+        """
+        Initializes ChapterJob attributes.
+
+        Parameters:
+            chapter (Dvk): Dvk with MangaDex chapter information
+            dvk_handler (DvkHandler): DvkHandler with the title's DVKs
+            rank (int): Position of the chapter from the newest in its title
+            pinned (bool): Whether the chapter's title is pinned
+        """
+        self.chapter = chapter
+        self.dvk_handler = dvk_handler
+        self.rank = rank
+        self.pinned = pinned
+
+    def get_priority(self) -> tuple:
+        """
+        Returns the priority of the job, lowest first.
+        Pinned titles come first, then the newest chapters of every title
+        before older chapters of any title.
+
+        Returns:
+            tuple: Priority of the job
+        """
+        pinned = 1
+        if self.pinned:
+            pinned = 0
+        time = 0
+        if self.chapter is not None:
+            time = get_time_int(self.chapter.get_time())
+        return (pinned, self.rank, -time)
+
+
+class DownloadScheduler:
+    """
+    Queues MangaDex chapter jobs across all titles in priority order.
+
+    Attributes:
+        queue (list): Heap of (priority, order, ChapterJob) tuples
+        order (int): Number of jobs added, to keep equal priorities in order
+        pinned (list): MangaDex title IDs to download first
+        bucket (TokenBucket): Bandwidth limit shared by all downloads
+    """
+
+    def __init__(self, bandwidth: int = 0, pinned: list = None):
+        """
+        Initializes DownloadScheduler attributes.
+
+        Parameters:
+            bandwidth (int): Bytes allowed per second, 0 for no limit
+            pinned (list): MangaDex title IDs to download first
+        """
+        self.queue = []
+        self.order = 0
+        self.pinned = []
+        if pinned is not None:
+            self.pinned = [str(id) for id in pinned]
+        self.bucket = TokenBucket(bandwidth)
+
+    def add_chapters(
+            self,
+            title_id: str = None,
+            chapters: list = None,
+            start_chapter: int = 0,
+            dvk_handler: DvkHandler = None):
+        """
+        Adds jobs for a title's chapters, up to a given start chapter.
+
+        Parameters:
+            title_id (str): MangaDex title ID number
+            chapters (list): List of Dvks with info from MangaDex chapters,
+                             as returned by get_chapters
+            start_chapter (int): Index of the oldest chapter to download,
+                                 as returned by get_start_chapter
+            dvk_handler (DvkHandler): DvkHandler with the title's DVKs
+        """
+        if chapters is None or len(chapters) == 0:
+            return
+        pinned = title_id is not None and str(title_id) in self.pinned
+        for i in range(0, min(start_chapter + 1, len(chapters))):
+            job = ChapterJob(chapters[i], dvk_handler, i, pinned)
+            heappush(self.queue, (job.get_priority(), self.order, job))
+            self.order = self.order + 1
+
+    def get_size(self) -> int:
+        """
+        Returns the number of jobs in the queue.
+
+        Returns:
+            int: Number of queued jobs
+        """
+        return len(self.queue)
+
+    def get_next_job(self) -> ChapterJob:
+        """
+        Removes and returns the job with the highest priority.
+
+        Returns:
+            ChapterJob: Next job to run, None if the queue is empty
+        """
+        if len(self.queue) == 0:
+            return None
+        return heappop(self.queue)[2]
@@ -0,0 +1,202 @@
+from pathlib import Path
+from shutil import rmtree
+from threading import Thread
+from traceback import print_exc
+from http.server import HTTPServer
+from bs4 import BeautifulSoup
+from dvk_manga.cassette import RECORD
+from dvk_manga.cassette import REPLAY
+from dvk_manga.cassette import Cassette
+from dvk_manga.cassette import CassetteConnect
+from dvk_manga.cassette import set_cassette
+from dvk_manga.cassette import get_cassette
+from dvk_manga.cassette import is_replaying
+from dvk_manga.cassette import get_connect
+from dvk_manga.connect import bs_connect
+from dvk_manga.connect import download
+from dvk_manga.connect import close_session
+from dvk_manga.scheduler import TokenBucket
+from dvk_manga.tests.test_connect import PageHandler
+
+
+class BrowserStandIn:
+    """
+    Stand-in for HeavyConnect that returns a fixed page.
+    """
+
+    def get_page(
+            self,
+            url: str = None,
+            wait: int = 0,
+            element: str = None) -> BeautifulSoup:
+        """
+        Returns a page with the URL in an image tag.
+        """
+        html = "<html><body><img src=\"" + url + "\"/></body></html>"
+        return BeautifulSoup(html, "lxml")
+
+    def close_driver(self):
+        """
+        Does nothing, as there is no driver.
+        """
+        return
+
+
+class TestCassette():
+    """
+    Unit tests for the cassette.py module.
+    """
+
+    def test_all(self):
+        """
+        Tests all functions of the cassette.py module.
+        """
+        try:
+            self.test_cassette()
+            self.test_cassette_connect()
+            self.test_record_replay()
+            print("\033[32mAll dvk_manga cassette tests passed.\033[0m")
+        except AssertionError:
+            print("\033[31mCheck failed:\033[0m")
+            print_exc()
+
+    def test_cassette(self):
+        """
+        Tests the Cassette class.
+        """
+        test_dir = Path("cassette1")
+        try:
+            test_dir.mkdir(exist_ok=True)
+            file = str(test_dir.joinpath("run.cassette").absolute())
+            cassette = Cassette(file, RECORD)
+            cassette.add_response("page", "a", b"first", {"X": "1"}, 0.5)
+            cassette.add_response("page", "a", b"second")
+            cassette.add_response("media", "b", bytes([0, 255]))
+            cassette.add_response("page", None, b"invalid")
+            cassette.write_cassette()
+            cassette = Cassette(file, REPLAY)
+            cassette.read_cassette()
+            assert cassette.get_response("page", "missing") is None
+            assert cassette.get_response() is None
+            response = cassette.get_response("page", "a")
+            assert response["body"] == b"first"
+            assert response["headers"] == {"X": "1"}
+            assert response["latency"] == 0.5
+            assert cassette.get_response("page", "a")["body"] == b"second"
+            assert cassette.get_response("page", "a")["body"] == b"second"
+            response = cassette.get_response("media", "b")
+            assert response["body"] == bytes([0, 255])
+            assert cassette.get_response("media", "a") is None
+            # BODIES ARE STORED RAW, OUTSIDE THE INDEX
+            bodies = cassette.get_bodies_file()
+            assert bodies.read_bytes() == b"firstsecond" + bytes([0, 255])
+            cassette.write_cassette()
+            assert bodies.stat().st_size == 13
+            # FILE RESPONSES ARE COPIED IN CHUNKS
+            media = test_dir.joinpath("a.jpg")
+            media.write_bytes(bytes(range(0, 256)) * 1000)
+            cassette = Cassette(file, RECORD)
+            cassette.add_file_response("media", "c", media, None, 0.1)
+            cassette.add_file_response("media", "d", None)
+            assert "body" not in cassette.entries["media c"][0]
+            # UNFINISHED RECORDING KEEPS COMPLETE RESPONSES
+            cassette.add_response("page", "e", b"page")
+            replay = Cassette(file, REPLAY)
+            replay.read_cassette()
+            response = replay.get_response("media", "c")
+            assert response["body"] == media.read_bytes()
+            assert replay.get_response("page", "e")["body"] == b"page"
+            replay.close_cassette()
+            cassette.close_cassette()
+            with open(str(bodies.absolute()), "r+b") as body_file:
+                body_file.truncate(bodies.stat().st_size - 1)
+            replay.read_cassette()
+            assert replay.get_response("media", "c") is not None
+            assert replay.get_response("page", "e") is None
+            replay.close_cassette()
+            # INVALID FILE
+            test_dir.joinpath("run.cassette").write_text("not gzip")
+            cassette.read_cassette()
+            assert cassette.entries == dict()
+        finally:
+            rmtree(test_dir.absolute())
+
+    def test_cassette_connect(self):
+        """
+        Tests the CassetteConnect class and get_connect function.
+        """
+        cassette = Cassette(None, RECORD)
+        connect = CassetteConnect(cassette, BrowserStandIn())
+        bs = connect.get_page("https://mangadex.org/chapter/1/1")
+        assert bs.find("img")["src"] == "https://mangadex.org/chapter/1/1"
+        assert connect.get_page() is None
+        connect.close_driver()
+        cassette.mode = REPLAY
+        connect = CassetteConnect(cassette)
+        bs = connect.get_page("https://mangadex.org/chapter/1/1")
+        assert bs.find("img")["src"] == "https://mangadex.org/chapter/1/1"
+        assert connect.get_page("https://mangadex.org/chapter/1/2") is None
+        try:
+            set_cassette(cassette)
+            assert get_cassette() is cassette
+            assert is_replaying()
+            assert isinstance(get_connect(), CassetteConnect)
+        finally:
+            set_cassette(None)
+        assert not is_replaying()
+
+    def test_record_replay(self):
+        """
+        Tests recording and replaying through the connect module.
+        """
+        server = HTTPServer(("127.0.0.1", 0), PageHandler)
+        thread = Thread(target=server.serve_forever)
+        thread.daemon = True
+        thread.start()
+        base = "http://127.0.0.1:" + str(server.server_port)
+        test_dir = Path("cassette2")
+        try:
+            test_dir.mkdir(exist_ok=True)
+            file = str(test_dir.joinpath("run.cassette").absolute())
+            # RECORD
+            cassette = Cassette(file, RECORD)
+            set_cassette(cassette)
+            bs = bs_connect(base + "/title")
+            assert bs.find("p").get_text() == "Page /title"
+            image = str(test_dir.joinpath("a.jpg").absolute())
+            download(base + "/a.jpg", image)
+            cassette.write_cassette()
+            close_session()
+        finally:
+            set_cassette(None)
+            server.shutdown()
+            server.server_close()
+        try:
+            # REPLAY WITH THE SERVER STOPPED
+            cassette = Cassette(file, REPLAY)
+            cassette.read_cassette()
+            set_cassette(cassette)
+            bs = bs_connect(base + "/title")
+            assert bs.find("p").get_text() == "Page /title"
+            assert bs_connect(base + "/other") is None
+            image = str(test_dir.joinpath("b.jpg").absolute())
+            bucket = TokenBucket(1000)
+            headers = download(base + "/a.jpg", image, bucket)
+            assert Path(image).read_bytes() == b"image/a.jpg"
+            assert bucket.tokens == 1000
+            assert headers["Last-Modified"] == "Sat, 21 Dec 2019 15:03:00 GMT"
+            image = str(test_dir.joinpath("c.jpg").absolute())
+            assert download(base + "/c.jpg", image) == dict()
+            assert not Path(image).exists()
+        finally:
+            set_cassette(None)
+            rmtree(test_dir.absolute())
+
+
+def main():
+    test_cassette = TestCassette()
+    test_cassette.test_all()
+
+
+if __name__ == "__main__":
+    main()
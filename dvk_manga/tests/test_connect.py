@@ -0,0 +1,286 @@
+from pathlib import Path
+from shutil import rmtree
+from threading import Thread
+from traceback import print_exc
+from http.server import HTTPServer
+from http.server import BaseHTTPRequestHandler
+from hashlib import sha256
+from dvk_archive.file.dvk import Dvk
+from dvk_manga.connect import get_session
+from dvk_manga.connect import set_pool_size
+from dvk_manga.connect import close_session
+from dvk_manga.connect import get_connection_stats
+from dvk_manga.connect import bs_connect
+from dvk_manga.connect import download
+from dvk_manga.connect import write_media
+from dvk_manga.connect import get_part_file
+from dvk_manga.connect import get_range_start
+from dvk_manga.scheduler import TokenBucket
+from dvk_manga.connect import get_validator
+from dvk_manga.connect import get_validator_file
+from dvk_manga.verify import read_hashes
+
+LAST_MODIFIED = "Sat, 21 Dec 2019 15:03:00 GMT"
+
+
+class PageHandler(BaseHTTPRequestHandler):
+    """
+    Serves small test pages over keep-alive connections.
+    """
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        """
+        Returns an HTML page, or a fake image for paths ending in .jpg.
+        Image requests support ranges with If-Range, and /cut.jpg drops
+        the connection halfway through unless a range is requested.
+        """
+        if self.path == "/missing.jpg":
+            self.send_response(404)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+        body = b"<html><body><p>Page " + self.path.encode() + b"</p></html>"
+        if self.path.endswith(".jpg"):
+            body = b"image" + self.path.encode()
+        if self.path == "/cut.jpg":
+            body = bytes(range(0, 256)) * 1000
+        start = 0
+        range_header = self.headers.get("Range")
+        if_range = self.headers.get("If-Range")
+        if not (if_range is None or if_range == LAST_MODIFIED):
+            range_header = None
+        if range_header is not None and self.path.endswith(".jpg"):
+            start = int(range_header[6:range_header.index("-")])
+            self.send_response(206)
+            self.send_header(
+                "Content-Range",
+                "bytes " + str(start) + "-" + str(len(body) - 1)
+                + "/" + str(len(body)))
+        else:
+            self.send_response(200)
+        self.send_header("Content-Length", str(len(body) - start))
+        self.send_header("Last-Modified", LAST_MODIFIED)
+        self.end_headers()
+        if self.path == "/cut.jpg" and range_header is None:
+            self.wfile.write(body[:len(body) // 2])
+            self.close_connection = True
+            return
+        self.wfile.write(body[start:])
+
+    def log_message(self, format, *args):
+        """
+        Hides request logs.
+        """
+        return
+
+
+class TestConnect():
+    """
+    Unit tests for the connect.py module.
+    """
+
+    def test_all(self):
+        """
+        Tests all functions of the connect.py module.
+        """
+        try:
+            self.test_get_session()
+            self.test_bs_connect()
+            self.test_download()
+            self.test_get_range_start()
+            self.test_download_resume()
+            print("\033[32mAll dvk_manga connect tests passed.\033[0m")
+        except AssertionError:
+            print("\033[31mCheck failed:\033[0m")
+            print_exc()
+
+    def start_server(self) -> HTTPServer:
+        """
+        Starts a local test server in a background thread.
+
+        Returns:
+            HTTPServer: Running test server
+        """
+        server = HTTPServer(("127.0.0.1", 0), PageHandler)
+        thread = Thread(target=server.serve_forever)
+        thread.daemon = True
+        thread.start()
+        return server
+
+    def get_url(self, server: HTTPServer = None, path: str = "") -> str:
+        """
+        Returns the URL for a path on the test server.
+
+        Parameters:
+            server (HTTPServer): Running test server
+            path (str): Path on the server
+
+        Returns:
+            str: Full URL
+        """
+        return "http://127.0.0.1:" + str(server.server_port) + path
+
+    def test_get_session(self):
+        """
+        Tests the get_session and set_pool_size functions.
+        """
+        close_session()
+        assert get_connection_stats()["requests"] == 0
+        session = get_session()
+        assert get_session() is session
+        set_pool_size(3)
+        assert get_session() is not session
+        adapter = get_session().get_adapter("https://")
+        assert adapter._pool_maxsize == 3
+        set_pool_size()
+        close_session()
+
+    def test_bs_connect(self):
+        """
+        Tests the bs_connect function and connection reuse.
+        """
+        server = self.start_server()
+        try:
+            close_session()
+            assert bs_connect() is None
+            assert bs_connect("not a url") is None
+            for i in range(0, 5):
+                bs = bs_connect(self.get_url(server, "/" + str(i)))
+                assert bs.find("p").get_text() == "Page /" + str(i)
+            stats = get_connection_stats()
+            assert stats["requests"] == 5
+            assert stats["connections"] == 1
+            assert stats["reused"] == 4
+        finally:
+            close_session()
+            server.shutdown()
+            server.server_close()
+
+    def test_download(self):
+        """
+        Tests the download and write_media functions.
+        """
+        server = self.start_server()
+        test_dir = Path("connect")
+        try:
+            test_dir.mkdir(exist_ok=True)
+            assert download() == dict()
+            file = str(test_dir.joinpath("a.jpg").absolute())
+            headers = download(self.get_url(server, "/a.jpg"), file)
+            assert headers["Content-Length"] == "11"
+            assert Path(file).read_bytes() == b"image/a.jpg"
+            # EXISTING FILE IS NOT OVERWRITTEN
+            download(self.get_url(server, "/b.jpg"), file)
+            file = test_dir.joinpath("a(1).jpg")
+            assert file.read_bytes() == b"image/b.jpg"
+            # WRITE MEDIA
+            dvk = Dvk()
+            dvk.set_file(test_dir.joinpath("page.dvk").absolute())
+            dvk.set_id("MDX1-1")
+            dvk.set_title("Page")
+            dvk.set_artist("artist")
+            dvk.set_page_url("https://mangadex.org/chapter/1/1")
+            dvk.set_direct_url(self.get_url(server, "/page.jpg"))
+            dvk.set_media_file("page.jpg")
+            write_media(dvk, True)
+            assert dvk.get_file().exists()
+            assert dvk.get_media_file().read_bytes() == b"image/page.jpg"
+            assert dvk.get_time() == "2019/12/21|15:03"
+            stats = get_connection_stats()
+            assert stats["connections"] == 1
+            assert stats["reused"] == 2
+            # DVK IS NOT WRITTEN WITHOUT ITS MEDIA
+            dvk.set_file(test_dir.joinpath("missing.dvk").absolute())
+            dvk.set_direct_url(self.get_url(server, "/missing.jpg"))
+            dvk.set_media_file("missing.jpg")
+            write_media(dvk)
+            assert not dvk.get_file().exists()
+        finally:
+            close_session()
+            server.shutdown()
+            server.server_close()
+            rmtree(test_dir.absolute())
+
+    def test_get_range_start(self):
+        """
+        Tests the get_range_start, get_part_file, get_validator_file and
+        get_validator functions.
+        """
+        assert get_range_start() == -1
+        assert get_range_start(dict()) == -1
+        headers = {"Content-Range": "bytes 200-999/1000"}
+        assert get_range_start(headers) == 200
+        assert get_range_start({"Content-Range": "bytes */1000"}) == -1
+        assert get_part_file() is None
+        part = get_part_file(Path("a.jpg"))
+        assert part == Path("a.jpg.part").absolute()
+        validator = get_validator_file(Path("a.jpg"))
+        assert validator == Path("a.jpg.part.validator").absolute()
+        assert get_validator() is None
+        assert get_validator({"ETag": "\"a\""}) == "\"a\""
+        headers = {"ETag": "W/\"a\"", "Last-Modified": LAST_MODIFIED}
+        assert get_validator(headers) == LAST_MODIFIED
+
+    def test_download_resume(self):
+        """
+        Tests streaming, hashing and resuming interrupted downloads.
+        """
+        server = self.start_server()
+        test_dir = Path("connect2")
+        try:
+            test_dir.mkdir(exist_ok=True)
+            body = bytes(range(0, 256)) * 1000
+            file = test_dir.joinpath("cut.jpg")
+            # INTERRUPTED DOWNLOAD LEAVES PARTIAL FILE
+            url = self.get_url(server, "/cut.jpg")
+            assert download(url, str(file.absolute())) == dict()
+            assert not file.exists()
+            part = get_part_file(file)
+            size = part.stat().st_size
+            assert 0 < size <= len(body) // 2
+            assert part.read_bytes() == body[:size]
+            assert get_validator_file(file).read_text() == LAST_MODIFIED
+            # RESUME FROM PARTIAL FILE
+            bucket = TokenBucket(1000000000)
+            headers = download(url, str(file.absolute()), bucket)
+            start = "bytes " + str(size) + "-"
+            assert headers["Content-Range"].startswith(start)
+            assert file.read_bytes() == body
+            assert not part.exists()
+            assert bucket.tokens < 1000000000
+            assert not get_validator_file(file).exists()
+            hashes = read_hashes(test_dir)
+            assert hashes["cut.jpg"] == sha256(body).hexdigest()
+            # CHANGED FILE IS DOWNLOADED AGAIN IN FULL
+            file = test_dir.joinpath("b.jpg")
+            get_part_file(file).write_bytes(b"stale")
+            get_validator_file(file).write_text("Mon, 01 Jan 2001")
+            url = self.get_url(server, "/b.jpg")
+            assert "Content-Range" not in download(url, str(file))
+            assert file.read_bytes() == b"image/b.jpg"
+            # PARTIAL FILE WITHOUT VALIDATOR IS NOT RESUMED
+            file = test_dir.joinpath("c.jpg")
+            get_part_file(file).write_bytes(b"stale")
+            url = self.get_url(server, "/c.jpg")
+            assert "Content-Range" not in download(url, str(file))
+            assert file.read_bytes() == b"image/c.jpg"
+            # FAILED STATUS DOES NOT WRITE A FILE
+            file = test_dir.joinpath("missing.jpg")
+            url = self.get_url(server, "/missing.jpg")
+            assert download(url, str(file.absolute())) == dict()
+            assert not file.exists()
+        finally:
+            close_session()
+            server.shutdown()
+            server.server_close()
+            rmtree(test_dir.absolute())
+
+
+def main():
+    test_connect = TestConnect()
+    test_connect.test_all()
+
+
+if __name__ == "__main__":
+    main()
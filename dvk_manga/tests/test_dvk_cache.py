@@ -0,0 +1,197 @@
+from pathlib import Path
+from shutil import rmtree
+from traceback import print_exc
+from dvk_archive.file.dvk import Dvk
+from dvk_manga.dvk_cache import CACHE_NAME
+from dvk_manga.dvk_cache import dvk_to_list
+from dvk_manga.dvk_cache import list_to_dvk
+from dvk_manga.dvk_cache import DvkCache
+from dvk_manga.dvk_cache import CachedDvkHandler
+
+
+class TestDvkCache():
+    """
+    Unit tests for the dvk_cache.py module.
+    """
+
+    def test_all(self):
+        """
+        Tests all functions of the dvk_cache.py module.
+        """
+        try:
+            self.test_dvk_to_list()
+            self.test_dvk_cache()
+            self.test_cached_dvk_handler()
+            self.test_cache_hits()
+            print("\033[32mAll dvk_manga cache tests passed.\033[0m")
+        except AssertionError:
+            print("\033[31mCheck failed:\033[0m")
+            print_exc()
+
+    def get_test_dvk(self, file: Path = None) -> Dvk:
+        """
+        Returns a Dvk object with test values.
+
+        Parameters:
+            file (Path): Path of the DVK file
+
+        Returns:
+            Dvk: Dvk object with test values
+        """
+        dvk = Dvk()
+        dvk.set_file(file)
+        dvk.set_id("MDX770791-3")
+        dvk.set_title("Randomphilia | Ch. 74 | Pg. 3")
+        dvk.set_artists(["Devin Bosco Le", "Biru no Fukuro"])
+        dvk.set_time("2019/12/21|15:03")
+        dvk.set_web_tags(["Mangadex:34326", "Comedy"])
+        dvk.set_description("Some description")
+        dvk.set_page_url("https://mangadex.org/chapter/770791/3")
+        dvk.set_direct_url("https://s5.mangadex.org/data/a/k3.jpg")
+        dvk.set_media_file("page.jpg")
+        return dvk
+
+    def test_dvk_to_list(self):
+        """
+        Tests the dvk_to_list and list_to_dvk functions.
+        """
+        assert dvk_to_list() == []
+        file = Path("cache0").joinpath("page.dvk").absolute()
+        dvk = list_to_dvk(None, file)
+        assert dvk.get_file() == file
+        assert dvk.get_id() == ""
+        values = dvk_to_list(self.get_test_dvk(file))
+        dvk = list_to_dvk(values, file)
+        assert dvk.get_id() == "MDX770791-3"
+        assert dvk.get_title() == "Randomphilia | Ch. 74 | Pg. 3"
+        assert dvk.get_artists() == ["Biru no Fukuro", "Devin Bosco Le"]
+        assert dvk.get_time() == "2019/12/21|15:03"
+        assert dvk.get_web_tags() == ["Mangadex:34326", "Comedy"]
+        assert dvk.get_description() == "Some description"
+        url = "https://mangadex.org/chapter/770791/3"
+        assert dvk.get_page_url() == url
+        url = "https://s5.mangadex.org/data/a/k3.jpg"
+        assert dvk.get_direct_url() == url
+        assert dvk.get_media_file() == file.parent.joinpath("page.jpg")
+        assert dvk.get_secondary_file() is None
+        assert dvk_to_list(dvk) == values
+        dvk.get_artists().append("Other")
+        assert len(values[2]) == 2
+
+    def test_dvk_cache(self):
+        """
+        Tests the DvkCache class.
+        """
+        test_dir = Path("cache1")
+        try:
+            test_dir.mkdir(exist_ok=True)
+            file = test_dir.joinpath("page.dvk").absolute()
+            self.get_test_dvk(file).write_dvk()
+            cache = DvkCache(str(test_dir))
+            cache.read_cache()
+            assert cache.entries == dict()
+            assert cache.get_dvk(file).get_id() == "MDX770791-3"
+            assert cache.changed
+            cache.write_cache()
+            assert test_dir.joinpath(CACHE_NAME).exists()
+            # READ UNCHANGED
+            cache = DvkCache(str(test_dir))
+            cache.read_cache()
+            assert len(cache.entries) == 1
+            assert cache.get_dvk(file).get_id() == "MDX770791-3"
+            assert not cache.changed
+            # READ CHANGED
+            dvk = self.get_test_dvk(file)
+            dvk.set_title("New Title")
+            dvk.write_dvk()
+            cache = DvkCache(str(test_dir))
+            cache.read_cache()
+            assert cache.get_dvk(file).get_title() == "New Title"
+            assert cache.changed
+            # INVALID CACHE FILE
+            test_dir.joinpath(CACHE_NAME).write_text("not json")
+            cache = DvkCache(str(test_dir))
+            cache.read_cache()
+            assert cache.entries == dict()
+        finally:
+            rmtree(test_dir.absolute())
+
+    def test_cached_dvk_handler(self):
+        """
+        Tests the CachedDvkHandler class.
+        """
+        test_dir = Path("cache2")
+        try:
+            sub_dir = test_dir.joinpath("sub")
+            sub_dir.mkdir(parents=True, exist_ok=True)
+            file = test_dir.joinpath("1.dvk").absolute()
+            self.get_test_dvk(file).write_dvk()
+            file = sub_dir.joinpath("2.dvk").absolute()
+            self.get_test_dvk(file).write_dvk()
+            dvk_handler = CachedDvkHandler()
+            dvk_handler.load_dvks([str(test_dir.absolute())])
+            assert dvk_handler.get_size() == 2
+            assert test_dir.joinpath(CACHE_NAME).exists()
+            # RELOAD FROM CACHE
+            dvk_handler = CachedDvkHandler()
+            dvk_handler.load_dvks([str(test_dir.absolute())])
+            assert dvk_handler.get_size() == 2
+            dvk_handler.sort_dvks("a")
+            file = dvk_handler.get_dvk_sorted(0).get_file()
+            assert file == test_dir.joinpath("1.dvk").absolute()
+            media = dvk_handler.get_dvk_sorted(1).get_media_file()
+            assert media == sub_dir.joinpath("page.jpg").absolute()
+            # REMOVED FILE IS DROPPED
+            sub_dir.joinpath("2.dvk").unlink()
+            dvk_handler.load_dvks([str(test_dir.absolute())])
+            assert dvk_handler.get_size() == 1
+            cache = DvkCache(str(test_dir))
+            cache.read_cache()
+            assert len(cache.entries) == 1
+        finally:
+            rmtree(test_dir.absolute())
+
+    def test_cache_hits(self):
+        """
+        Tests that cache hits skip parsing and escaping DVK values.
+        """
+        test_dir = Path("cache3")
+        calls = {"read_dvk": 0, "set_description": 0}
+        read_dvk = Dvk.read_dvk
+        set_description = Dvk.set_description
+
+        def count_read_dvk(dvk):
+            calls["read_dvk"] = calls["read_dvk"] + 1
+            read_dvk(dvk)
+
+        def count_set_description(dvk, description_str=None):
+            calls["set_description"] = calls["set_description"] + 1
+            set_description(dvk, description_str)
+
+        try:
+            test_dir.mkdir(exist_ok=True)
+            for i in range(0, 20):
+                file = test_dir.joinpath(str(i) + ".dvk").absolute()
+                self.get_test_dvk(file).write_dvk()
+            CachedDvkHandler().load_dvks([str(test_dir.absolute())])
+            Dvk.read_dvk = count_read_dvk
+            Dvk.set_description = count_set_description
+            dvk_handler = CachedDvkHandler()
+            dvk_handler.load_dvks([str(test_dir.absolute())])
+            assert dvk_handler.get_size() == 20
+            assert calls == {"read_dvk": 0, "set_description": 0}
+            dvk = dvk_handler.get_dvk_direct(0)
+            assert dvk.get_description() == "Some description"
+        finally:
+            Dvk.read_dvk = read_dvk
+            Dvk.set_description = set_description
+            rmtree(test_dir.absolute())
+
+
+def main():
+    test_dvk_cache = TestDvkCache()
+    test_dvk_cache.test_all()
+
+
+if __name__ == "__main__":
+    main()
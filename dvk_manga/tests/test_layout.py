@@ -0,0 +1,180 @@
+from pathlib import Path
+from shutil import rmtree
+from traceback import print_exc
+from dvk_archive.file.dvk import Dvk
+from dvk_manga.layout import FLAT
+from dvk_manga.layout import TITLE
+from dvk_manga.layout import CHAPTER
+from dvk_manga.layout import get_title_id_from_dvk
+from dvk_manga.layout import get_chapter_id_from_dvk
+from dvk_manga.layout import get_title_directory
+from dvk_manga.layout import get_page_directory
+from dvk_manga.layout import get_layout_titles
+from dvk_manga.layout import migrate_layout
+from dvk_manga.dvk_cache import CACHE_NAME
+from dvk_manga.dvk_cache import CachedDvkHandler
+from dvk_manga.verify import HASH_NAME
+from dvk_manga.verify import add_hash
+from dvk_manga.verify import read_hashes
+
+
+class TestLayout():
+    """
+    Unit tests for the layout.py module.
+    """
+
+    def test_all(self):
+        """
+        Tests all functions of the layout.py module.
+        """
+        try:
+            self.test_get_title_id_from_dvk()
+            self.test_get_chapter_id_from_dvk()
+            self.test_get_page_directory()
+            self.test_get_layout_titles()
+            self.test_migrate_layout()
+            print("\033[32mAll dvk_manga layout tests passed.\033[0m")
+        except AssertionError:
+            print("\033[31mCheck failed:\033[0m")
+            print_exc()
+
+    def test_get_title_id_from_dvk(self):
+        """
+        Tests the get_title_id_from_dvk function.
+        """
+        assert get_title_id_from_dvk() == ""
+        dvk = Dvk()
+        assert get_title_id_from_dvk(dvk) == ""
+        dvk.set_web_tags(["Shounen", "Mangadex:34326"])
+        assert get_title_id_from_dvk(dvk) == "34326"
+
+    def test_get_chapter_id_from_dvk(self):
+        """
+        Tests the get_chapter_id_from_dvk function.
+        """
+        assert get_chapter_id_from_dvk() == ""
+        dvk = Dvk()
+        dvk.set_id("ID123")
+        assert get_chapter_id_from_dvk(dvk) == ""
+        dvk.set_id("MDX770791-3")
+        assert get_chapter_id_from_dvk(dvk) == "770791"
+
+    def test_get_page_directory(self):
+        """
+        Tests the get_title_directory and get_page_directory functions.
+        """
+        base = Path("base")
+        assert get_title_directory() is None
+        assert get_page_directory() is None
+        assert get_title_directory(base, "12", FLAT) == base
+        assert get_title_directory(base, "12", TITLE) == Path("base/12")
+        assert get_title_directory(base, "", CHAPTER) == base
+        assert get_page_directory(base, "12", "34", FLAT) == base
+        assert get_page_directory(base, "12", "34", TITLE) == Path("base/12")
+        page_dir = get_page_directory(base, "12", "34", CHAPTER)
+        assert page_dir == Path("base/12/34")
+        assert get_page_directory(base, "12", "", CHAPTER) == Path("base/12")
+
+    def test_get_layout_titles(self):
+        """
+        Tests the get_layout_titles function.
+        """
+        test_dir = Path("layout1")
+        try:
+            assert get_layout_titles() == []
+            assert get_layout_titles(test_dir) == []
+            test_dir.joinpath("200").mkdir(parents=True)
+            test_dir.joinpath("35").mkdir()
+            test_dir.joinpath("other").mkdir()
+            test_dir.joinpath("7").touch()
+            assert get_layout_titles(test_dir) == ["35", "200"]
+        finally:
+            rmtree(test_dir.absolute())
+
+    def test_migrate_layout(self):
+        """
+        Tests the migrate_layout function.
+        """
+        test_dir = Path("layout2")
+        try:
+            test_dir.mkdir(exist_ok=True)
+            assert migrate_layout() == 0
+            assert migrate_layout(str(test_dir), "bleh") == 0
+            # MANGADEX DVK
+            dvk = Dvk()
+            dvk.set_file(test_dir.joinpath("page.dvk").absolute())
+            dvk.set_id("MDX770791-3")
+            dvk.set_title("Randomphilia | Ch. 74 | Pg. 3")
+            dvk.set_artist("whatever")
+            dvk.set_page_url("https://mangadex.org/chapter/770791/3")
+            dvk.set_web_tags(["Mangadex:34326"])
+            dvk.set_media_file("page.jpg")
+            dvk.write_dvk()
+            dvk.get_media_file().write_bytes(b"image")
+            add_hash(dvk.get_media_file(), "0" * 64)
+            test_dir.joinpath("other.jpg").write_bytes(b"image")
+            add_hash(test_dir.joinpath("other.jpg"), "1" * 64)
+            # OTHER DVK
+            dvk = Dvk()
+            dvk.set_file(test_dir.joinpath("other.dvk").absolute())
+            dvk.set_id("ID123")
+            dvk.set_title("Other")
+            dvk.set_artist("whatever")
+            dvk.set_page_url("https://www.othersite.com/page")
+            dvk.set_web_tags(["Mangadex:34326"])
+            dvk.set_media_file("other.jpg")
+            dvk.write_dvk()
+            # MIGRATE TO CHAPTER LAYOUT
+            assert migrate_layout(str(test_dir), CHAPTER) == 1
+            page_dir = test_dir.joinpath("34326").joinpath("770791")
+            assert page_dir.joinpath("page.dvk").exists()
+            assert page_dir.joinpath("page.jpg").exists()
+            assert not test_dir.joinpath("page.dvk").exists()
+            assert test_dir.joinpath("other.dvk").exists()
+            dvk = Dvk(str(page_dir.joinpath("page.dvk").absolute()))
+            dvk.read_dvk()
+            assert dvk.get_media_file().exists()
+            assert read_hashes(page_dir) == {"page.jpg": "0" * 64}
+            assert read_hashes(test_dir) == {"other.jpg": "1" * 64}
+            assert migrate_layout(str(test_dir), CHAPTER) == 0
+            # MIGRATE TO TITLE LAYOUT
+            assert migrate_layout(str(test_dir), TITLE) == 1
+            title_dir = test_dir.joinpath("34326")
+            assert title_dir.joinpath("page.dvk").exists()
+            assert title_dir.joinpath("page.jpg").exists()
+            assert read_hashes(title_dir) == {"page.jpg": "0" * 64}
+            assert not page_dir.exists()
+            # MIGRATE BACK TO FLAT LAYOUT
+            assert migrate_layout(str(test_dir), FLAT) == 1
+            assert test_dir.joinpath("page.dvk").exists()
+            assert test_dir.joinpath("page.jpg").exists()
+            assert read_hashes(test_dir)["page.jpg"] == "0" * 64
+            assert not title_dir.exists()
+            # HASH FILE REMOVED ONCE EMPTY
+            test_dir.joinpath("other.dvk").unlink()
+            test_dir.joinpath("other.jpg").unlink()
+            assert migrate_layout(str(test_dir), TITLE) == 1
+            assert not test_dir.joinpath(HASH_NAME).exists()
+            # DIRECTORY WITH ONLY A CACHE FILE IS REMOVED
+            title_dir = test_dir.joinpath("34326")
+            CachedDvkHandler().load_dvks([str(title_dir.absolute())])
+            assert title_dir.joinpath(CACHE_NAME).exists()
+            assert migrate_layout(str(test_dir), FLAT) == 1
+            assert not title_dir.exists()
+            # COLLIDING FILES ARE SKIPPED
+            title_dir.mkdir()
+            title_dir.joinpath("page.jpg").write_bytes(b"other")
+            assert migrate_layout(str(test_dir), TITLE) == 0
+            assert test_dir.joinpath("page.dvk").exists()
+            assert title_dir.joinpath("page.jpg").read_bytes() == b"other"
+        finally:
+            rmtree(test_dir.absolute())
+
+
+def main():
+    test_layout = TestLayout()
+    test_layout.test_all()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,4 +1,5 @@
 from pathlib import Path
+from bs4 import BeautifulSoup
 from shutil import rmtree
 from traceback import print_exc
 from dvk_archive.file.dvk import Dvk
@@ -11,6 +12,37 @@ from dvk_manga.mangadex import get_title_info
 from dvk_manga.mangadex import get_chapters
 from dvk_manga.mangadex import get_start_chapter
 from dvk_manga.mangadex import get_dvks
+from dvk_manga.mangadex import get_base_directory
+import dvk_manga.connect
+from dvk_manga.layout import FLAT
+from dvk_manga.layout import TITLE
+
+
+class PageStandIn:
+    """
+    Stand-in for HeavyConnect that returns a one page MangaDex chapter.
+    """
+
+    def get_page(
+            self,
+            url: str = None,
+            wait: int = 0,
+            element: str = None) -> BeautifulSoup:
+        """
+        Returns a chapter page for page 1, None for other pages.
+        """
+        if not url.endswith("/1"):
+            return None
+        html = "<span class=\"chapter-title\" data-chapter-id=\"1\">"
+        html = html + "</span><div data-page=\"1\"><img class=\"noselect "
+        html = html + "nodrag cursor-pointer\" src=\"http://x/1.jpg\"></div>"
+        return BeautifulSoup(html, "lxml")
+
+    def close_driver(self):
+        """
+        Does nothing, as there is no driver.
+        """
+        return
 
 
 class TestMangadex():
@@ -27,6 +59,8 @@ class TestMangadex():
             self.test_get_chapter_id()
             self.test_get_id_from_tag()
             self.test_get_downloaded_titles()
+            self.test_get_base_directory()
+            self.test_repair_page()
             self.test_get_title_info()
             self.test_get_chapters()
             self.test_get_start_chapter()
@@ -73,6 +107,89 @@ class TestMangadex():
         assert get_id_from_tag("Mangadex:2345") == "2345"
         assert get_id_from_tag("mangadex:bleh") == "bleh"
 
+    def test_get_base_directory(self):
+        """
+        Tests the get_base_directory function.
+        """
+        assert get_base_directory() is None
+        assert get_base_directory(Path("archive"), FLAT) is None
+        directory = str(Path("archive").absolute())
+        assert get_base_directory(Path("archive"), TITLE) == directory
+
+    def test_repair_page(self):
+        """
+        Tests that get_dvks only replaces broken pages once the new
+        download succeeds.
+        """
+        test_dir = Path("mangadex3")
+        download = dvk_manga.connect.download
+
+        def write_image(url, filename, bucket=None):
+            Path(filename).write_bytes(b"new")
+            return dict()
+
+        def fail(url, filename, bucket=None):
+            return dict()
+
+        def interrupt(url, filename, bucket=None):
+            Path(filename).write_bytes(b"ne")
+            raise KeyboardInterrupt()
+
+        try:
+            test_dir.mkdir(exist_ok=True)
+            chapter = Dvk()
+            chapter.set_id("1")
+            chapter.set_title("Title | Ch. 1")
+            chapter.set_artist("whatever")
+            chapter.set_page_url("https://mangadex.org/chapter/1/")
+            # BROKEN PAGE
+            dvk = Dvk()
+            dvk.set_id("MDX1-1")
+            dvk.set_title("Title | Ch. 1 | Pg. 1")
+            dvk.set_artist("whatever")
+            dvk.set_page_url("https://mangadex.org/chapter/1/1")
+            file = test_dir.joinpath(dvk.get_filename() + ".dvk")
+            dvk.set_file(file.absolute())
+            dvk.set_media_file(dvk.get_filename() + ".jpg")
+            dvk.write_dvk()
+            media = dvk.get_media_file()
+            media.write_bytes(b"old")
+            broken = {dvk.get_id(): dvk}
+            dvk_handler = DvkHandler()
+            dvk_handler.load_dvks([str(test_dir.absolute())])
+            # INTERRUPTED DOWNLOAD RESTORES THE BROKEN PAGE
+            dvk_manga.connect.download = interrupt
+            try:
+                get_dvks(
+                    dvk_handler, [chapter], True, True, FLAT, None,
+                    PageStandIn(), None, broken)
+                assert False
+            except KeyboardInterrupt:
+                pass
+            assert file.exists()
+            assert media.read_bytes() == b"old"
+            assert len(list(test_dir.iterdir())) == 2
+            # FAILED DOWNLOAD RESTORES THE BROKEN PAGE
+            dvk_manga.connect.download = fail
+            get_dvks(
+                dvk_handler, [chapter], True, True, FLAT, None,
+                PageStandIn(), None, broken)
+            assert file.exists()
+            assert media.read_bytes() == b"old"
+            assert len(list(test_dir.iterdir())) == 2
+            # SUCCESSFUL DOWNLOAD REPLACES THE BROKEN PAGE
+            dvk_manga.connect.download = write_image
+            dvks = get_dvks(
+                dvk_handler, [chapter], True, True, FLAT, None,
+                PageStandIn(), None, broken)
+            assert len(dvks) == 1
+            assert file.exists()
+            assert media.read_bytes() == b"new"
+            assert len(list(test_dir.iterdir())) == 2
+        finally:
+            dvk_manga.connect.download = download
+            rmtree(test_dir.absolute())
+
     def test_get_downloaded_titles(self):
         try:
             test_dir = Path("mangadex1")
@@ -0,0 +1,115 @@
+from traceback import print_exc
+from dvk_archive.file.dvk import Dvk
+from dvk_manga.scheduler import get_time_int
+from dvk_manga.scheduler import TokenBucket
+from dvk_manga.scheduler import DownloadScheduler
+
+
+class TestScheduler():
+    """
+    Unit tests for the scheduler.py module.
+    """
+
+    def test_all(self):
+        """
+        Tests all functions of the scheduler.py module.
+        """
+        try:
+            self.test_get_time_int()
+            self.test_token_bucket()
+            self.test_download_scheduler()
+            print("\033[32mAll dvk_manga scheduler tests passed.\033[0m")
+        except AssertionError:
+            print("\033[31mCheck failed:\033[0m")
+            print_exc()
+
+    def get_chapters(self, title: str = None, times: list = None) -> list:
+        """
+        Returns a list of chapter Dvks with the given times, newest first.
+
+        Parameters:
+            title (str): Title of the chapters
+            times (list): Times of the chapters
+
+        Returns:
+            list: List of chapter Dvks
+        """
+        chapters = []
+        for i in range(0, len(times)):
+            dvk = Dvk()
+            dvk.set_title(title + " | Ch. " + str(len(times) - i))
+            dvk.set_time(times[i])
+            chapters.append(dvk)
+        return chapters
+
+    def test_get_time_int(self):
+        """
+        Tests the get_time_int function.
+        """
+        assert get_time_int() == 0
+        assert get_time_int("") == 0
+        assert get_time_int("2019/12/21|15:03") == 201912211503
+        assert get_time_int("2018/01/18|19:08") < 201912211503
+
+    def test_token_bucket(self):
+        """
+        Tests the TokenBucket class.
+        """
+        times = [0.0]
+        waits = []
+
+        def wait(seconds: float = 0.0):
+            waits.append(seconds)
+            times[0] = times[0] + seconds
+
+        # NO LIMIT
+        bucket = TokenBucket()
+        bucket.clock = lambda: times[0]
+        bucket.wait = wait
+        assert bucket.consume(1000000) == 0.0
+        # LIMITED
+        bucket = TokenBucket(100)
+        bucket.clock = lambda: times[0]
+        bucket.wait = wait
+        bucket.last = times[0]
+        assert bucket.capacity == 100
+        assert bucket.consume(100) == 0.0
+        assert bucket.consume(50) == 0.5
+        assert waits == [0.5]
+        times[0] = times[0] + 1.0
+        assert bucket.consume(100) == 0.0
+        assert bucket.consume(300) == 3.0
+        assert bucket.consume(0) == 0.0
+        assert TokenBucket(100, 500).capacity == 500
+
+    def test_download_scheduler(self):
+        """
+        Tests the DownloadScheduler class.
+        """
+        scheduler = DownloadScheduler(pinned=[3])
+        assert scheduler.get_size() == 0
+        assert scheduler.get_next_job() is None
+        scheduler.add_chapters("1", None, 0)
+        assert scheduler.get_size() == 0
+        times = ["2020/03/01|00:00", "2020/02/01|00:00", "2020/01/01|00:00"]
+        scheduler.add_chapters("1", self.get_chapters("A", times), 2)
+        times = ["2021/03/01|00:00", "2021/02/01|00:00"]
+        scheduler.add_chapters("2", self.get_chapters("B", times), 5)
+        times = ["2019/03/01|00:00", "2019/02/01|00:00"]
+        scheduler.add_chapters("3", self.get_chapters("C", times), 0)
+        assert scheduler.get_size() == 6
+        titles = []
+        while scheduler.get_size() > 0:
+            titles.append(scheduler.get_next_job().chapter.get_title())
+        assert titles == [
+            "C | Ch. 2", "B | Ch. 2", "A | Ch. 3",
+            "B | Ch. 1", "A | Ch. 2", "A | Ch. 1"]
+
+
+def main():
+    test_scheduler = TestScheduler()
+    test_scheduler.test_all()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,233 @@
+from hashlib import sha256
+from pathlib import Path
+from shutil import rmtree
+from traceback import print_exc
+from dvk_archive.file.dvk import Dvk
+from dvk_manga.verify import PROGRESS_NAME
+from dvk_manga.verify import read_hashes
+from dvk_manga.verify import add_hash
+from dvk_manga.verify import is_complete_image
+from dvk_manga.verify import verify_media
+from dvk_manga.verify import read_progress
+from dvk_manga.verify import verify_archive
+from dvk_manga.verify import restore_dvk_files
+from dvk_manga.verify import quarantine_dvk_files
+from dvk_manga.verify import remove_quarantined_files
+from dvk_manga.verify import get_repair_chapters
+
+JPEG = b"\xff\xd8\xff\xe0" + bytes(200) + b"\xff\xd9"
+PNG = b"\x89PNG\r\n\x1a\n" + bytes(200) + b"\x00\x00\x00\x00IEND\xaeB`\x82"
+
+
+class TestVerify():
+    """
+    Unit tests for the verify.py module.
+    """
+
+    def test_all(self):
+        """
+        Tests all functions of the verify.py module.
+        """
+        try:
+            self.test_hashes()
+            self.test_is_complete_image()
+            self.test_verify_media()
+            self.test_verify_archive()
+            self.test_quarantine_dvk_files()
+            self.test_get_repair_chapters()
+            print("\033[32mAll dvk_manga verify tests passed.\033[0m")
+        except AssertionError:
+            print("\033[31mCheck failed:\033[0m")
+            print_exc()
+
+    def write_page(
+            self,
+            directory: Path = None,
+            page: int = 1,
+            media: bytes = None) -> Dvk:
+        """
+        Writes a MangaDex page DVK and its media file.
+
+        Parameters:
+            directory (Path): Directory to write to
+            page (int): Page number
+            media (bytes): Contents of the media file, None for no file
+
+        Returns:
+            Dvk: Written Dvk
+        """
+        dvk = Dvk()
+        dvk.set_file(directory.joinpath(str(page) + ".dvk").absolute())
+        dvk.set_id("MDX770791-" + str(page))
+        dvk.set_title("Randomphilia | Ch. 74 | Pg. " + str(page))
+        dvk.set_artist("whatever")
+        dvk.set_web_tags(["Mangadex:34326"])
+        dvk.set_page_url("https://mangadex.org/chapter/770791/" + str(page))
+        dvk.set_media_file(str(page) + ".jpg")
+        dvk.write_dvk()
+        if media is not None:
+            dvk.get_media_file().write_bytes(media)
+        return dvk
+
+    def test_hashes(self):
+        """
+        Tests the read_hashes and add_hash functions.
+        """
+        test_dir = Path("verify1")
+        try:
+            test_dir.mkdir(exist_ok=True)
+            assert read_hashes() == dict()
+            assert read_hashes(test_dir) == dict()
+            add_hash(test_dir.joinpath("a b.jpg"), "0" * 64)
+            add_hash(test_dir.joinpath("c.jpg"), "1" * 64)
+            add_hash(test_dir.joinpath("c.jpg"), "invalid")
+            add_hash(test_dir.joinpath("a b.jpg"), "2" * 64)
+            hashes = read_hashes(test_dir)
+            assert hashes == {"a b.jpg": "2" * 64, "c.jpg": "1" * 64}
+        finally:
+            rmtree(test_dir.absolute())
+
+    def test_is_complete_image(self):
+        """
+        Tests the is_complete_image function.
+        """
+        assert not is_complete_image()
+        assert is_complete_image(JPEG[:16], JPEG[-1024:], len(JPEG))
+        assert not is_complete_image(JPEG[:16], JPEG[-20:-2], len(JPEG))
+        assert is_complete_image(PNG[:16], PNG[-1024:], len(PNG))
+        assert not is_complete_image(PNG[:16], PNG[-40:-8], len(PNG))
+        gif = b"GIF89a" + bytes(100) + b";"
+        assert is_complete_image(gif[:16], gif, len(gif))
+        assert not is_complete_image(gif[:16], gif[:-1], len(gif))
+        webp = b"RIFF" + (100).to_bytes(4, "little") + b"WEBP"
+        assert is_complete_image(webp, webp, 108)
+        assert not is_complete_image(webp, webp, 50)
+        assert not is_complete_image(b"not an image", b"", 12)
+
+    def test_verify_media(self):
+        """
+        Tests the verify_media function.
+        """
+        test_dir = Path("verify2")
+        try:
+            test_dir.mkdir(exist_ok=True)
+            file = test_dir.joinpath("a.jpg")
+            result = verify_media((0, str(file), None))
+            assert result[1] == "missing media file"
+            file.write_bytes(JPEG[:50])
+            result = verify_media((1, str(file), None))
+            assert result[0] == 1
+            assert result[1] == "media file too small"
+            file.write_bytes(JPEG[:-2])
+            assert verify_media((2, str(file), None))[1] != ""
+            file.write_bytes(JPEG)
+            result = verify_media((3, str(file), None))
+            assert result[1] == ""
+            assert result[2] == len(JPEG)
+            digest = sha256(JPEG).hexdigest()
+            assert verify_media((4, str(file), digest))[1] == ""
+            result = verify_media((5, str(file), "0" * 64))
+            assert result[1] == "hash mismatch"
+        finally:
+            rmtree(test_dir.absolute())
+
+    def test_verify_archive(self):
+        """
+        Tests the verify_archive function.
+        """
+        test_dir = Path("verify3")
+        try:
+            test_dir.mkdir(exist_ok=True)
+            assert verify_archive() == []
+            self.write_page(test_dir, 1, JPEG)
+            self.write_page(test_dir, 2, JPEG[:-2])
+            self.write_page(test_dir, 3)
+            dvk = self.write_page(test_dir, 4, PNG)
+            add_hash(dvk.get_media_file(), "0" * 64)
+            broken = verify_archive(str(test_dir), 2)
+            ids = sorted([dvk.get_id() for dvk in broken])
+            assert ids == ["MDX770791-2", "MDX770791-3", "MDX770791-4"]
+            assert not test_dir.joinpath(PROGRESS_NAME).exists()
+            # RESUME SKIPS VERIFIED FILES
+            media = str(test_dir.joinpath("1.jpg").absolute())
+            stat = Path(media).stat()
+            line = str(stat.st_size) + " " + str(stat.st_mtime_ns) + " "
+            progress = test_dir.joinpath(PROGRESS_NAME)
+            progress.write_text(line + media + "\n")
+            assert read_progress(test_dir)[media][0] == len(JPEG)
+            test_dir.joinpath("4.jpg").write_bytes(PNG)
+            test_dir.joinpath("dvk_manga.sha256").unlink()
+            broken = verify_archive(str(test_dir), 1)
+            ids = sorted([dvk.get_id() for dvk in broken])
+            assert ids == ["MDX770791-2", "MDX770791-3"]
+            # BROKEN FILES ARE NOT REMOVED
+            assert test_dir.joinpath("2.jpg").exists()
+            broken = verify_archive(str(test_dir), 1)
+            assert len(broken) == 2
+        finally:
+            rmtree(test_dir.absolute())
+
+    def test_quarantine_dvk_files(self):
+        """
+        Tests the quarantine_dvk_files, restore_dvk_files and
+        remove_quarantined_files functions.
+        """
+        assert quarantine_dvk_files() == []
+        test_dir = Path("verify5")
+        try:
+            test_dir.mkdir(exist_ok=True)
+            dvk = self.write_page(test_dir, 1, JPEG[:-2])
+            self.write_page(test_dir, 2)
+            # FAILED DOWNLOAD RESTORES BROKEN FILES
+            moved = quarantine_dvk_files(dvk)
+            assert len(moved) == 2
+            assert not test_dir.joinpath("1.dvk").exists()
+            assert not test_dir.joinpath("1.jpg").exists()
+            assert test_dir.joinpath("1.jpg.broken").exists()
+            restore_dvk_files(moved)
+            assert test_dir.joinpath("1.dvk").exists()
+            assert test_dir.joinpath("1.jpg").read_bytes() == JPEG[:-2]
+            assert not test_dir.joinpath("1.jpg.broken").exists()
+            # SUCCESSFUL DOWNLOAD REMOVES BROKEN FILES
+            moved = quarantine_dvk_files(dvk)
+            self.write_page(test_dir, 1, JPEG)
+            remove_quarantined_files(moved)
+            assert test_dir.joinpath("1.jpg").read_bytes() == JPEG
+            assert not test_dir.joinpath("1.dvk.broken").exists()
+            assert not test_dir.joinpath("1.jpg.broken").exists()
+            broken = verify_archive(str(test_dir), 1)
+            assert [dvk.get_id() for dvk in broken] == ["MDX770791-2"]
+        finally:
+            rmtree(test_dir.absolute())
+
+    def test_get_repair_chapters(self):
+        """
+        Tests the get_repair_chapters function.
+        """
+        assert get_repair_chapters() == []
+        test_dir = Path("verify4")
+        try:
+            test_dir.mkdir(exist_ok=True)
+            dvks = [
+                self.write_page(test_dir, 1),
+                self.write_page(test_dir, 2),
+                Dvk()]
+            chapters = get_repair_chapters(dvks)
+            assert len(chapters) == 1
+            assert chapters[0].get_id() == "770791"
+            assert chapters[0].get_title() == "Randomphilia | Ch. 74"
+            url = "https://mangadex.org/chapter/770791/"
+            assert chapters[0].get_page_url() == url
+            assert chapters[0].get_web_tags() == ["Mangadex:34326"]
+            assert chapters[0].get_artists() == ["whatever"]
+        finally:
+            rmtree(test_dir.absolute())
+
+
+def main():
+    test_verify = TestVerify()
+    test_verify.test_all()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,212 @@
+from pathlib import Path
+from shutil import rmtree
+from threading import Event
+from threading import Thread
+from traceback import print_exc
+from dvk_archive.file.dvk import Dvk
+from dvk_manga.scheduler import ChapterJob
+from dvk_manga.scheduler import DownloadScheduler
+from dvk_manga.work_queue import WorkQueue
+from dvk_manga.work_queue import keep_lease
+
+
+class TestWorkQueue():
+    """
+    Unit tests for the work_queue.py module.
+    """
+
+    def test_all(self):
+        """
+        Tests all functions of the work_queue.py module.
+        """
+        try:
+            self.test_add_and_claim()
+            self.test_leases()
+            self.test_keep_lease()
+            self.test_failed_jobs()
+            print("\033[32mAll dvk_manga work queue tests passed.\033[0m")
+        except AssertionError:
+            print("\033[31mCheck failed:\033[0m")
+            print_exc()
+
+    def get_chapter(self, chapter_id: str = None, time: str = None) -> Dvk:
+        """
+        Returns a chapter Dvk for testing.
+
+        Parameters:
+            chapter_id (str): MangaDex chapter ID
+            time (str): Time the chapter was published
+
+        Returns:
+            Dvk: Dvk holding MangaDex chapter information
+        """
+        dvk = Dvk()
+        dvk.set_id(chapter_id)
+        dvk.set_title("Title | Ch. " + chapter_id)
+        dvk.set_artist("artist")
+        dvk.set_time(time)
+        dvk.set_web_tags(["Mangadex:34326"])
+        dvk.set_page_url("https://mangadex.org/chapter/" + chapter_id + "/")
+        return dvk
+
+    def test_add_and_claim(self):
+        """
+        Tests adding jobs to and claiming jobs from the WorkQueue.
+        """
+        test_dir = Path("queue1")
+        try:
+            test_dir.mkdir(exist_ok=True)
+            file = str(test_dir.joinpath("queue.db").absolute())
+            work_queue = WorkQueue(file)
+            assert work_queue.claim_job("a") is None
+            scheduler = DownloadScheduler()
+            chapters = [
+                self.get_chapter("3", "2020/03/01|00:00"),
+                self.get_chapter("2", "2020/02/01|00:00"),
+                self.get_chapter("1", "2020/01/01|00:00")]
+            scheduler.add_chapters("34326", chapters, 2)
+            assert work_queue.add_jobs(scheduler) == 3
+            assert scheduler.get_size() == 0
+            assert work_queue.get_counts()["queued"] == 3
+            # SECOND CONNECTION SEES THE SAME QUEUE
+            other = WorkQueue(file)
+            job_id, chapter = other.claim_job("b")
+            assert chapter.get_id() == "3"
+            assert chapter.get_title() == "Title | Ch. 3"
+            assert chapter.get_web_tags() == ["Mangadex:34326"]
+            url = "https://mangadex.org/chapter/3/"
+            assert chapter.get_page_url() == url
+            assert work_queue.claim_job("a")[1].get_id() == "2"
+            assert not work_queue.complete_job(job_id, "a")
+            assert other.complete_job(job_id, "b")
+            counts = work_queue.get_counts()
+            counts.pop("failed")
+            assert counts == {"queued": 1, "leased": 1, "done": 1}
+            # DONE CHAPTERS ARE QUEUED AGAIN, LEASED ONES ARE NOT
+            work_queue.add_job(ChapterJob(chapters[0]))
+            work_queue.add_job(ChapterJob(chapters[1]))
+            counts = work_queue.get_counts()
+            counts.pop("failed")
+            assert counts == {"queued": 2, "leased": 1, "done": 0}
+            other.close()
+            work_queue.close()
+        finally:
+            rmtree(test_dir.absolute())
+
+    def test_leases(self):
+        """
+        Tests lease expiry, renewal and release.
+        """
+        test_dir = Path("queue2")
+        try:
+            test_dir.mkdir(exist_ok=True)
+            file = str(test_dir.joinpath("queue.db").absolute())
+            times = [1000.0]
+            work_queue = WorkQueue(file)
+            work_queue.clock = lambda: times[0]
+            work_queue.add_job(ChapterJob(self.get_chapter("1")))
+            job_id = work_queue.claim_job("a", 60)[0]
+            assert work_queue.claim_job("b", 60) is None
+            # RENEWED LEASE
+            times[0] = 1050.0
+            assert work_queue.renew_lease(job_id, "a", 60)
+            times[0] = 1100.0
+            assert work_queue.claim_job("b", 60) is None
+            # EXPIRED LEASE IS CLAIMED BY ANOTHER WORKER
+            times[0] = 1200.0
+            assert work_queue.get_counts()["queued"] == 1
+            assert work_queue.claim_job("b", 60)[0] == job_id
+            assert not work_queue.renew_lease(job_id, "a", 60)
+            assert not work_queue.complete_job(job_id, "a")
+            # RELEASED JOB
+            assert work_queue.release_job(job_id, "b")
+            assert work_queue.claim_job("c", 60)[0] == job_id
+            assert work_queue.complete_job(job_id, "c")
+            assert work_queue.get_counts()["done"] == 1
+            work_queue.close()
+        finally:
+            rmtree(test_dir.absolute())
+
+    def test_keep_lease(self):
+        """
+        Tests the keep_lease function.
+        """
+        test_dir = Path("queue3")
+        try:
+            test_dir.mkdir(exist_ok=True)
+            file = str(test_dir.joinpath("queue.db").absolute())
+            work_queue = WorkQueue(file)
+            work_queue.add_job(ChapterJob(self.get_chapter("1")))
+            job_id = work_queue.claim_job("a", 0.3)[0]
+            stop = Event()
+            thread = Thread(
+                target=keep_lease,
+                args=(file, job_id, "a", 0.3, stop))
+            thread.start()
+            stop.wait(0.6)
+            assert work_queue.claim_job("b", 0.3) is None
+            stop.set()
+            thread.join()
+            # LEASE TAKEN BY ANOTHER WORKER
+            stop = Event()
+            lost = Event()
+            thread = Thread(
+                target=keep_lease,
+                args=(file, job_id, "a", 0.3, stop, lost))
+            thread.start()
+            work_queue.clock = lambda: 5000000000.0
+            assert work_queue.claim_job("b", 0.3)[0] == job_id
+            assert lost.wait(1)
+            thread.join()
+            # QUEUE FILE UNREACHABLE
+            stop = Event()
+            lost = Event()
+            missing = str(test_dir.joinpath("missing/queue.db").absolute())
+            thread = Thread(
+                target=keep_lease,
+                args=(missing, job_id, "b", 0.3, stop, lost))
+            thread.start()
+            assert not lost.wait(0.15)
+            assert lost.wait(1)
+            thread.join()
+            work_queue.close()
+        finally:
+            rmtree(test_dir.absolute())
+
+    def test_failed_jobs(self):
+        """
+        Tests that jobs claimed too many times are marked as failed.
+        """
+        test_dir = Path("queue4")
+        try:
+            test_dir.mkdir(exist_ok=True)
+            file = str(test_dir.joinpath("queue.db").absolute())
+            times = [1000.0]
+            work_queue = WorkQueue(file)
+            work_queue.clock = lambda: times[0]
+            chapter = self.get_chapter("1")
+            work_queue.add_job(ChapterJob(chapter))
+            # EVERY WORKER CRASHES, SO THE LEASE EXPIRES EACH TIME
+            for worker in ["a", "b"]:
+                assert work_queue.claim_job(worker, 60, 2) is not None
+                times[0] = times[0] + 100
+            assert work_queue.claim_job("c", 60, 2) is None
+            counts = work_queue.get_counts()
+            assert counts["failed"] == 1
+            assert counts["queued"] == 0
+            # FAILED CHAPTERS ARE QUEUED AGAIN WHEN ADDED
+            work_queue.add_job(ChapterJob(chapter))
+            assert work_queue.get_counts()["queued"] == 1
+            assert work_queue.claim_job("c", 60, 2) is not None
+            work_queue.close()
+        finally:
+            rmtree(test_dir.absolute())
+
+
+def main():
+    test_work_queue = TestWorkQueue()
+    test_work_queue.test_all()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,376 @@
+from os import remove
+from os import replace
+from os import cpu_count
+from tqdm import tqdm
+from hashlib import sha256
+from pathlib import Path
+from concurrent.futures import ProcessPoolExecutor
+from dvk_archive.file.dvk import Dvk
+from dvk_manga.dvk_cache import CachedDvkHandler
+
+HASH_NAME = "dvk_manga.sha256"
+PROGRESS_NAME = "dvk_manga_verify.txt"
+MIN_SIZE = 100
+QUARANTINE_SUFFIX = ".broken"
+TAIL_SIZE = 1024
+
+
+def read_hashes(directory: Path = None) -> dict:
+    """
+    Returns the stored media hashes for a directory.
+    Hashes are kept in sha256sum format, later lines taking precedence.
+
+    Parameters:
+        directory (Path): Directory containing the media files
+
+    Returns:
+        dict: SHA-256 hex digests by media filename
+    """
+    hashes = dict()
+    if directory is None:
+        return hashes
+    file = Path(directory).joinpath(HASH_NAME)
+    if not file.is_file():
+        return hashes
+    with open(str(file.absolute())) as in_file:
+        for line in in_file:
+            line = line.rstrip("\n")
+            if len(line) > 66 and line[64:66] == "  ":
+                hashes[line[66:]] = line[:64]
+    return hashes
+
+
+def add_hash(media_file: Path = None, digest: str = None):
+    """
+    Stores the hash of a media file in its directory's hash file.
+
+    Parameters:
+        media_file (Path): Media file that was hashed
+        digest (str): SHA-256 hex digest of the media file
+    """
+    if media_file is None or digest is None or not len(digest) == 64:
+        return
+    media_file = Path(media_file)
+    file = media_file.parent.joinpath(HASH_NAME)
+    with open(str(file.absolute()), "a") as out_file:
+        out_file.write(digest + "  " + media_file.name + "\n")
+
+
+def remove_stale_hashes(directory: Path = None):
+    """
+    Removes the hashes of media files no longer in a directory from its
+    hash file, deleting the hash file if no hashes are left.
+
+    Parameters:
+        directory (Path): Directory containing the media files
+    """
+    if directory is None:
+        return
+    file = Path(directory).joinpath(HASH_NAME)
+    if not file.is_file():
+        return
+    hashes = read_hashes(directory)
+    lines = []
+    for name in hashes:
+        if Path(directory).joinpath(name).is_file():
+            lines.append(hashes[name] + "  " + name + "\n")
+    if len(lines) == 0:
+        remove(str(file.absolute()))
+        return
+    with open(str(file.absolute()), "w") as out_file:
+        out_file.write("".join(lines))
+
+
+def is_complete_image(head: bytes = None, tail: bytes = None,
+                      size: int = 0) -> bool:
+    """
+    Returns whether the start and end of a file look like a complete
+    JPEG, PNG, GIF or WebP image.
+
+    Parameters:
+        head (bytes): First bytes of the file
+        tail (bytes): Last bytes of the file
+        size (int): Size of the file in bytes
+
+    Returns:
+        bool: Whether the file looks like a complete image
+    """
+    if head is None or tail is None:
+        return False
+    if head.startswith(b"\xff\xd8\xff"):
+        return b"\xff\xd9" in tail
+    if head.startswith(b"\x89PNG\r\n\x1a\n"):
+        return b"IEND" in tail[-12:]
+    if head.startswith(b"GIF87a") or head.startswith(b"GIF89a"):
+        return tail.endswith(b";")
+    if head.startswith(b"RIFF") and head[8:12] == b"WEBP":
+        return int.from_bytes(head[4:8], "little") + 8 <= size
+    return False
+
+
+def verify_media(task: tuple = None) -> tuple:
+    """
+    Checks that a media file exists, has a plausible size, looks like a
+    complete image and matches its stored hash, if any.
+    Runs in a worker process.
+
+    Parameters:
+        task (tuple): (index, media file path, stored hash or None)
+
+    Returns:
+        tuple: (index, problem or empty string, size, mtime)
+    """
+    index, media_str, digest = task
+    media = Path(media_str)
+    if not media.is_file():
+        return (index, "missing media file", 0, 0)
+    stat = media.stat()
+    if stat.st_size < MIN_SIZE:
+        return (index, "media file too small", stat.st_size, 0)
+    with open(str(media.absolute()), "rb") as in_file:
+        head = in_file.read(16)
+        in_file.seek(max(0, stat.st_size - TAIL_SIZE))
+        tail = in_file.read()
+        if digest is not None:
+            in_file.seek(0)
+            hasher = sha256()
+            for chunk in iter(lambda: in_file.read(65536), b""):
+                hasher.update(chunk)
+            if not hasher.hexdigest() == digest:
+                return (index, "hash mismatch", stat.st_size, 0)
+    if not is_complete_image(head, tail, stat.st_size):
+        return (index, "incomplete or invalid image", stat.st_size, 0)
+    return (index, "", stat.st_size, stat.st_mtime_ns)
+
+
+def read_progress(directory: Path = None) -> dict:
+    """
+    Returns the media files already verified by an interrupted run.
+
+    Parameters:
+        directory (Path): Base directory of the archive
+
+    Returns:
+        dict: (size, mtime) of verified media files by path
+    """
+    progress = dict()
+    if directory is None:
+        return progress
+    file = Path(directory).joinpath(PROGRESS_NAME)
+    if not file.is_file():
+        return progress
+    with open(str(file.absolute())) as in_file:
+        for line in in_file:
+            parts = line.rstrip("\n").split(" ", 2)
+            if len(parts) == 3:
+                try:
+                    progress[parts[2]] = (int(parts[0]), int(parts[1]))
+                except ValueError:
+                    continue
+    return progress
+
+
+def verify_archive(
+        directory_str: str = None,
+        processes: int = None,
+        resume: bool = True) -> list:
+    """
+    Verifies the media files of all MangaDex DVKs in an archive using
+    a pool of worker processes.
+    Verified files are logged so an interrupted run can be resumed.
+
+    Parameters:
+        directory_str (str): Base directory of the archive
+        processes (int): Number of worker processes, defaults to CPU count
+        resume (bool): Whether to skip files verified by an interrupted run
+
+    Returns:
+        list: Dvks with broken media files
+    """
+    if directory_str is None or not Path(directory_str).is_dir():
+        return []
+    directory = Path(directory_str).absolute()
+    if processes is None or processes < 1:
+        processes = cpu_count() or 1
+    dvk_handler = CachedDvkHandler()
+    dvk_handler.load_dvks([str(directory)])
+    progress = dict()
+    if resume:
+        progress = read_progress(directory)
+    # GET MEDIA FILES TO VERIFY
+    dvks = []
+    tasks = []
+    hashes = dict()
+    for i in range(0, dvk_handler.get_size()):
+        dvk = dvk_handler.get_dvk_direct(i)
+        if "/mangadex." not in str(dvk.get_page_url()).lower():
+            continue
+        media = dvk.get_media_file()
+        if media is None:
+            dvks.append(dvk)
+            tasks.append((len(tasks), "", None))
+            continue
+        previous = progress.get(str(media))
+        if previous is not None:
+            try:
+                stat = media.stat()
+                if previous == (stat.st_size, stat.st_mtime_ns):
+                    continue
+            except OSError:
+                pass
+        parent = str(media.parent)
+        if parent not in hashes:
+            hashes[parent] = read_hashes(media.parent)
+        digest = hashes[parent].get(media.name)
+        dvks.append(dvk)
+        tasks.append((len(tasks), str(media), digest))
+    # VERIFY IN WORKER PROCESSES
+    broken = []
+    chunksize = max(1, min(256, len(tasks) // (processes * 4)))
+    progress_file = directory.joinpath(PROGRESS_NAME)
+    print("Verifying Media Files:")
+    with open(str(progress_file.absolute()), "a") as log:
+        with ProcessPoolExecutor(max_workers=processes) as executor:
+            results = executor.map(verify_media, tasks, chunksize=chunksize)
+            for result in tqdm(results, total=len(tasks)):
+                dvk = dvks[result[0]]
+                if result[1] == "":
+                    log.write(str(result[2]) + " " + str(result[3]) + " "
+                              + str(dvk.get_media_file()) + "\n")
+                else:
+                    print("Broken: " + str(dvk.get_file())
+                          + " - " + result[1])
+                    broken.append(dvk)
+    remove(str(progress_file.absolute()))
+    return broken
+
+
+def has_all_files(dvk: Dvk = None) -> bool:
+    """
+    Returns whether a Dvk file and all of its media files exist.
+
+    Parameters:
+        dvk (Dvk): Dvk to check
+
+    Returns:
+        bool: Whether all the files of the Dvk exist
+    """
+    if dvk is None or dvk.get_file() is None:
+        return False
+    for file in [dvk.get_file(), dvk.get_media_file()]:
+        if file is None or not file.is_file():
+            return False
+    secondary = dvk.get_secondary_file()
+    return secondary is None or secondary.is_file()
+
+
+def remove_dvk_files(dvk: Dvk = None):
+    """
+    Deletes a Dvk file and its media files, if they exist.
+
+    Parameters:
+        dvk (Dvk): Dvk to delete
+    """
+    if dvk is None:
+        return
+    for file in [
+            dvk.get_file(),
+            dvk.get_media_file(),
+            dvk.get_secondary_file()]:
+        if file is not None and file.is_file():
+            remove(str(file.absolute()))
+
+
+def quarantine_dvk_files(dvk: Dvk = None) -> list:
+    """
+    Renames a Dvk file and its media files to quarantine names, so they
+    can be downloaded again and restored if the new download fails.
+
+    Parameters:
+        dvk (Dvk): Dvk to quarantine
+
+    Returns:
+        list: (original path, quarantine path) of each renamed file
+    """
+    moved = []
+    if dvk is None or dvk.get_file() is None:
+        return moved
+    for file in [
+            dvk.get_file(),
+            dvk.get_media_file(),
+            dvk.get_secondary_file()]:
+        if file is not None and file.is_file():
+            quarantine = Path(str(file.absolute()) + QUARANTINE_SUFFIX)
+            replace(str(file.absolute()), str(quarantine.absolute()))
+            moved.append((file, quarantine))
+    return moved
+
+
+def restore_dvk_files(moved: list = None):
+    """
+    Moves quarantined files back to their original paths.
+    Files written to those paths since they were quarantined are replaced.
+
+    Parameters:
+        moved (list): Renamed files, as returned by quarantine_dvk_files
+    """
+    if moved is None:
+        return
+    for file, quarantine in moved:
+        if quarantine.is_file():
+            replace(str(quarantine.absolute()), str(file.absolute()))
+
+
+def remove_quarantined_files(moved: list = None):
+    """
+    Deletes quarantined files once their replacements were downloaded.
+
+    Parameters:
+        moved (list): Renamed files, as returned by quarantine_dvk_files
+    """
+    if moved is None:
+        return
+    for file, quarantine in moved:
+        if quarantine.is_file():
+            remove(str(quarantine.absolute()))
+
+
+def get_repair_chapters(dvks: list = None) -> list:
+    """
+    Returns chapter Dvks for re-downloading the chapters of broken pages,
+    in the same form as returned by get_chapters.
+
+    Parameters:
+        dvks (list): Dvks for broken MangaDex pages
+
+    Returns:
+        list: List of Dvks holding MangaDex chapter information
+    """
+    chapters = []
+    if dvks is None:
+        return chapters
+    ids = []
+    for dvk in dvks:
+        page_url = dvk.get_page_url()
+        if (page_url is None
+                or "/chapter/" not in page_url
+                or not dvk.get_id().startswith("MDX")
+                or "-" not in dvk.get_id()):
+            continue
+        chapter_id = dvk.get_id()[3:dvk.get_id().rindex("-")]
+        if chapter_id in ids:
+            continue
+        ids.append(chapter_id)
+        chapter = Dvk()
+        chapter.set_id(chapter_id)
+        title = dvk.get_title()
+        if " | Pg. " in title:
+            title = title[:title.rindex(" | Pg. ")]
+        chapter.set_title(title)
+        chapter.set_artists(dvk.get_artists())
+        chapter.set_time(dvk.get_time())
+        chapter.set_web_tags(dvk.get_web_tags())
+        chapter.set_description(dvk.get_description())
+        chapter.set_page_url(page_url[:page_url.rindex("/") + 1])
+        chapters.append(chapter)
+    return chapters
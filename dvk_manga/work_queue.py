@@ -0,0 +1,291 @@
+from json import dumps
+from json import loads
+from time import time
+from sqlite3 import connect
+from sqlite3 import OperationalError
+from pathlib import Path
+from threading import Event
+from dvk_manga.dvk_cache import dvk_to_list
+from dvk_manga.dvk_cache import list_to_dvk
+from dvk_manga.layout import get_title_id_from_dvk
+from dvk_manga.scheduler import ChapterJob
+from dvk_manga.scheduler import DownloadScheduler
+
+QUEUED = "queued"
+LEASED = "leased"
+DONE = "done"
+FAILED = "failed"
+LEASE_SECONDS = 600
+MAX_ATTEMPTS = 3
+
+
+class WorkQueue:
+    """
+    Queue of MangaDex chapter jobs in an SQLite file, shared by a
+    coordinator and download workers on any number of hosts.
+    Workers lease jobs for a limited time, so the jobs of a crashed
+    worker are handed out again once their lease expires.
+    Jobs that were claimed too many times without finishing are marked
+    as failed instead of being handed out forever.
+
+    Attributes:
+        file (Path): Path of the SQLite queue file
+        connection (sqlite3.Connection): Connection to the queue file
+        clock (function): Function returning the current time in seconds
+    """
+
+    def __init__(self, file_str: str = None):
+        """
+        Initializes WorkQueue attributes and creates the queue table.
+
+        Parameters:
+            file_str (str): Path of the SQLite queue file
+        """
+        self.file = Path(file_str)
+        self.connection = connect(
+            str(self.file.absolute()),
+            timeout=60,
+            isolation_level=None)
+        self.clock = time
+        self.connection.execute(
+            "CREATE TABLE IF NOT EXISTS jobs ("
+            + "id INTEGER PRIMARY KEY AUTOINCREMENT, "
+            + "chapter_id TEXT UNIQUE NOT NULL, "
+            + "title_id TEXT, "
+            + "chapter TEXT NOT NULL, "
+            + "pinned INTEGER, "
+            + "rank INTEGER, "
+            + "time INTEGER, "
+            + "status TEXT NOT NULL, "
+            + "worker TEXT, "
+            + "lease_expires REAL, "
+            + "attempts INTEGER DEFAULT 0)")
+
+    def close(self):
+        """
+        Closes the connection to the queue file.
+        """
+        self.connection.close()
+
+    def add_job(self, job: ChapterJob = None):
+        """
+        Adds a chapter job to the queue.
+        Chapters that were already done or failed are queued again,
+        chapters that are queued or leased are left alone.
+
+        Parameters:
+            job (ChapterJob): Job to add
+        """
+        if job is None or job.chapter is None:
+            return
+        priority = job.get_priority()
+        self.connection.execute(
+            "INSERT INTO jobs (chapter_id, title_id, chapter, pinned, rank, "
+            + "time, status) VALUES (?, ?, ?, ?, ?, ?, ?) "
+            + "ON CONFLICT(chapter_id) DO UPDATE SET "
+            + "chapter = excluded.chapter, pinned = excluded.pinned, "
+            + "rank = excluded.rank, time = excluded.time, "
+            + "status = excluded.status, worker = NULL, "
+            + "lease_expires = NULL, attempts = 0 "
+            + "WHERE status IN (?, ?)",
+            (job.chapter.get_id(),
+             get_title_id_from_dvk(job.chapter),
+             dumps(dvk_to_list(job.chapter)),
+             priority[0], priority[1], priority[2], QUEUED, DONE, FAILED))
+
+    def add_jobs(self, scheduler: DownloadScheduler = None) -> int:
+        """
+        Moves all the jobs from a DownloadScheduler into the queue.
+
+        Parameters:
+            scheduler (DownloadScheduler): Scheduler holding chapter jobs
+
+        Returns:
+            int: Number of jobs moved
+        """
+        if scheduler is None:
+            return 0
+        moved = 0
+        self.connection.execute("BEGIN IMMEDIATE")
+        try:
+            while scheduler.get_size() > 0:
+                self.add_job(scheduler.get_next_job())
+                moved = moved + 1
+            self.connection.execute("COMMIT")
+        except Exception:
+            self.connection.execute("ROLLBACK")
+            raise
+        return moved
+
+    def claim_job(
+            self,
+            worker: str = None,
+            lease_seconds: float = LEASE_SECONDS,
+            max_attempts: int = MAX_ATTEMPTS) -> tuple:
+        """
+        Leases the queued job with the highest priority to a worker.
+        Jobs whose lease has expired are treated as queued, unless they
+        were already claimed max_attempts times, which marks them failed.
+
+        Parameters:
+            worker (str): Name of the worker claiming the job
+            lease_seconds (float): Seconds before the lease expires
+            max_attempts (int): Number of claims before a job fails
+
+        Returns:
+            tuple: (job ID, chapter Dvk), None if no job is available
+        """
+        now = self.clock()
+        self.connection.execute("BEGIN IMMEDIATE")
+        try:
+            self.connection.execute(
+                "UPDATE jobs SET status = ?, worker = NULL, "
+                + "lease_expires = NULL WHERE attempts >= ? AND "
+                + "(status = ? OR (status = ? AND lease_expires < ?))",
+                (FAILED, max_attempts, QUEUED, LEASED, now))
+            row = self.connection.execute(
+                "SELECT id, chapter FROM jobs WHERE status = ? "
+                + "OR (status = ? AND lease_expires < ?) "
+                + "ORDER BY pinned, rank, time, id LIMIT 1",
+                (QUEUED, LEASED, now)).fetchone()
+            if row is not None:
+                self.connection.execute(
+                    "UPDATE jobs SET status = ?, worker = ?, "
+                    + "lease_expires = ?, attempts = attempts + 1 "
+                    + "WHERE id = ?",
+                    (LEASED, worker, now + lease_seconds, row[0]))
+            self.connection.execute("COMMIT")
+        except Exception:
+            self.connection.execute("ROLLBACK")
+            raise
+        if row is None:
+            return None
+        return (row[0], list_to_dvk(loads(row[1])))
+
+    def renew_lease(
+            self,
+            job_id: int = None,
+            worker: str = None,
+            lease_seconds: float = LEASE_SECONDS) -> bool:
+        """
+        Extends the lease of a job still held by a worker.
+
+        Parameters:
+            job_id (int): ID of the leased job
+            worker (str): Name of the worker holding the lease
+            lease_seconds (float): Seconds from now before the lease expires
+
+        Returns:
+            bool: Whether the worker still held the lease
+        """
+        cursor = self.connection.execute(
+            "UPDATE jobs SET lease_expires = ? "
+            + "WHERE id = ? AND worker = ? AND status = ?",
+            (self.clock() + lease_seconds, job_id, worker, LEASED))
+        return cursor.rowcount == 1
+
+    def complete_job(self, job_id: int = None, worker: str = None) -> bool:
+        """
+        Marks a job as done, if the worker still holds its lease.
+
+        Parameters:
+            job_id (int): ID of the leased job
+            worker (str): Name of the worker holding the lease
+
+        Returns:
+            bool: Whether the job was marked as done
+        """
+        cursor = self.connection.execute(
+            "UPDATE jobs SET status = ?, lease_expires = NULL "
+            + "WHERE id = ? AND worker = ? AND status = ?",
+            (DONE, job_id, worker, LEASED))
+        return cursor.rowcount == 1
+
+    def release_job(self, job_id: int = None, worker: str = None) -> bool:
+        """
+        Returns a leased job to the queue so another worker can claim it.
+
+        Parameters:
+            job_id (int): ID of the leased job
+            worker (str): Name of the worker holding the lease
+
+        Returns:
+            bool: Whether the job was returned to the queue
+        """
+        cursor = self.connection.execute(
+            "UPDATE jobs SET status = ?, worker = NULL, lease_expires = NULL "
+            + "WHERE id = ? AND worker = ? AND status = ?",
+            (QUEUED, job_id, worker, LEASED))
+        return cursor.rowcount == 1
+
+    def get_counts(self) -> dict:
+        """
+        Returns the number of jobs with each status.
+        Leased jobs with an expired lease are counted as queued.
+
+        Returns:
+            dict: Number of jobs by status
+        """
+        counts = {QUEUED: 0, LEASED: 0, DONE: 0, FAILED: 0}
+        rows = self.connection.execute(
+            "SELECT CASE WHEN status = ? AND lease_expires < ? THEN ? "
+            + "ELSE status END, COUNT(*) FROM jobs GROUP BY 1",
+            (LEASED, self.clock(), QUEUED)).fetchall()
+        for row in rows:
+            counts[row[0]] = counts.get(row[0], 0) + row[1]
+        return counts
+
+
+def keep_lease(
+        file_str: str = None,
+        job_id: int = None,
+        worker: str = None,
+        lease_seconds: float = LEASE_SECONDS,
+        stop: Event = None,
+        lost: Event = None):
+    """
+    Renews the lease of a job every third of the lease time until stopped.
+    Meant to run in a background thread while the job is being worked on,
+    so it uses its own connection to the queue file.
+    Renewals that fail because the queue file is locked or unreachable are
+    retried, and the lease is given up shortly before it would expire.
+
+    Parameters:
+        file_str (str): Path of the SQLite queue file
+        job_id (int): ID of the leased job
+        worker (str): Name of the worker holding the lease
+        lease_seconds (float): Seconds before the lease expires
+        stop (Event): Event set when the job is finished
+        lost (Event): Event set if the lease is lost, so the job
+                      can be abandoned
+    """
+    if stop is None:
+        return
+    if lost is None:
+        lost = Event()
+    retry = lease_seconds / 12
+    wait = lease_seconds / 3
+    expires = time() + lease_seconds
+    work_queue = None
+    try:
+        while not stop.wait(wait):
+            try:
+                if work_queue is None:
+                    work_queue = WorkQueue(file_str)
+                renewed = work_queue.renew_lease(job_id, worker, lease_seconds)
+            except OperationalError as e:
+                if time() + retry < expires:
+                    # TRY AGAIN BEFORE THE LEASE EXPIRES
+                    print("Failed to renew lease, retrying: " + str(e))
+                    wait = retry
+                    continue
+                renewed = False
+            if not renewed:
+                print("Lost lease on job " + str(job_id) + ".")
+                lost.set()
+                break
+            expires = time() + lease_seconds
+            wait = lease_seconds / 3
+    finally:
+        if work_queue is not None:
+            work_queue.close()
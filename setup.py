@@ -2,6 +2,7 @@ import setuptools
 
 console_scripts = [
     "dvk-mangadex = dvk_manga.mangadex:main",
+    "dvk-manga-migrate = dvk_manga.layout:main",
     "dvk-manga-test = dvk_manga.tests.test_mangadex:main"]
 
 with open("README.md", "r") as fh:
@@ -17,7 +18,7 @@ setuptools.setup(
     long_description_content_type="text/markdown",
     url="https://github.com/Drakovek/dvk_manga",
     packages=setuptools.find_packages(),
-    install_requires=["beautifulsoup4", "dvk-archive", "tqdm"],
+    install_requires=["beautifulsoup4", "dvk-archive", "requests", "tqdm"],
     classifiers=[
         "Programming Language :: Python :: 3",
         "License :: OSI Approved :: GNU General Public License v3 (GPLv3)",
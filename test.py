@@ -1,5 +1,26 @@
+from dvk_manga.tests.test_cassette import TestCassette
+from dvk_manga.tests.test_connect import TestConnect
+from dvk_manga.tests.test_dvk_cache import TestDvkCache
+from dvk_manga.tests.test_layout import TestLayout
 from dvk_manga.tests.test_mangadex import TestMangadex
+from dvk_manga.tests.test_scheduler import TestScheduler
+from dvk_manga.tests.test_verify import TestVerify
+from dvk_manga.tests.test_work_queue import TestWorkQueue
 
 if __name__ == "__main__":
+    test_cassette = TestCassette()
+    test_cassette.test_all()
+    test_connect = TestConnect()
+    test_connect.test_all()
+    test_dvk_cache = TestDvkCache()
+    test_dvk_cache.test_all()
+    test_layout = TestLayout()
+    test_layout.test_all()
+    test_scheduler = TestScheduler()
+    test_scheduler.test_all()
+    test_verify = TestVerify()
+    test_verify.test_all()
+    test_work_queue = TestWorkQueue()
+    test_work_queue.test_all()
     test_mangadex = TestMangadex()
     test_mangadex.test_all()